@@ -23,6 +23,7 @@ class ServiceAdmin(admin.ModelAdmin):
         'is_active', 'is_featured', 'view_count', 'booking_count' , 'rating'
     ]
     search_fields = ['id','name', 'category__name']
+    list_select_related = ['category']
     list_editable = ['price', 'discount_price', 'is_active', 'is_featured']
     prepopulated_fields = {'slug': ('name',)}
     ordering = ['-created_at']
@@ -40,6 +41,7 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_filter = ['id','status', 'is_paid', 'appointment_date', 'created_at' , 'updated_at']
     search_fields = ['id','customer__username', 'customer__phone', 'service__name']
     raw_id_fields = ['customer', 'staff']
+    list_select_related = ['customer', 'service__category', 'staff']
     list_editable = ['status', 'is_paid']
     date_hierarchy = 'appointment_date'
 
@@ -67,6 +69,7 @@ class TimeSlotAdmin(admin.ModelAdmin):
     list_display = ['staff', 'weekday', 'start_time', 'end_time', 'is_available']
     list_filter = ['weekday', 'is_available']
     search_fields = ['staff__username']
+    list_select_related = ['staff']
     list_editable = ['is_available']
 
 
@@ -0,0 +1,174 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .availability import date_range, holiday_dates, weekly_templates
+from .models import Appointment, RevenueDirtyDay, RevenueSummary, TimeSlot, day_start
+
+# Revenue and utilization reports read RevenueSummary rows (one per day,
+# staff member, service and payment method). Appointment changes only mark
+# their days dirty; dirty days are re-aggregated from one columnar
+# values_list() pass before a report reads them, or by the
+# refresh_revenue_summaries command.
+
+GROUPS = {
+    'day': 'date',
+    'staff': 'staff_id',
+    'service': 'service_id',
+    'category': 'service__category_id',
+    'payment_method': 'payment_method',
+}
+
+SUMMARY_COLUMNS = ('starts_at', 'ends_at', 'staff_id', 'service_id', 'payment_method',
+                   'is_paid', 'total_price', 'status')
+
+
+def mark_dirty(days):
+    now = timezone.now()
+    RevenueDirtyDay.objects.bulk_create(
+        [RevenueDirtyDay(date=day, marked_at=now) for day in set(days) if day is not None],
+        update_conflicts=True, unique_fields=['date'], update_fields=['marked_at'],
+    )
+
+
+def contiguous_ranges(days):
+    days = sorted(set(days))
+    ranges = []
+    for day in days:
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+
+def summarize(rows):
+    # one pass over the column tuples; a list of running totals per key
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0])
+    for starts_at, ends_at, staff_id, service_id, method, is_paid, price, status in rows:
+        entry = totals[timezone.localdate(starts_at), staff_id, service_id, method or '']
+        entry[0] += 1
+        entry[2] += price
+        if is_paid:
+            entry[1] += 1
+            entry[3] += price
+        if status not in Appointment.INACTIVE_STATUSES:
+            entry[4] += int((ends_at - starts_at).total_seconds()) // 60
+    return totals
+
+
+def rebuild_days(days):
+    ranges = contiguous_ranges(days)
+    if not ranges:
+        return 0
+    # plain starts_at ranges so the (starts_at) index drives the scan
+    window = Q()
+    for first, last in ranges:
+        window |= Q(starts_at__gte=day_start(first), starts_at__lt=day_start(last + timedelta(days=1)))
+    rows = (
+        Appointment.objects.filter(window, starts_at__isnull=False)
+        .exclude(status__in=Appointment.VOID_STATUSES)
+        .values_list(*SUMMARY_COLUMNS)
+    )
+    summaries = [
+        RevenueSummary(
+            date=day, staff_id=staff_id, service_id=service_id, payment_method=method,
+            appointments=count, paid_appointments=paid, revenue=revenue,
+            paid_revenue=paid_revenue, booked_minutes=minutes,
+        )
+        for (day, staff_id, service_id, method), (count, paid, revenue, paid_revenue, minutes)
+        in summarize(rows.iterator(chunk_size=5000)).items()
+    ]
+    day_filter = Q()
+    for first, last in ranges:
+        day_filter |= Q(date__range=(first, last))
+    with transaction.atomic():
+        RevenueSummary.objects.filter(day_filter).delete()
+        RevenueSummary.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
+
+
+def refresh_dirty(start_date=None, end_date=None):
+    marks = RevenueDirtyDay.objects.all()
+    if start_date is not None:
+        marks = marks.filter(date__range=(start_date, end_date))
+    read = list(marks.values_list('pk', 'date', 'marked_at'))
+    if not read:
+        return 0
+    # only the marks read above are cleared; a day marked again meanwhile
+    # has a new marked_at and stays dirty
+    seen = defaultdict(list)
+    for pk, day, marked_at in read:
+        seen[marked_at].append(pk)
+    cleared = Q()
+    for marked_at, pks in seen.items():
+        cleared |= Q(marked_at=marked_at, pk__in=pks)
+    with transaction.atomic():
+        rebuild_days([day for pk, day, marked_at in read])
+        RevenueDirtyDay.objects.filter(cleared).delete()
+    return len(read)
+
+
+def rebuild_all(chunk_days=31):
+    bounds = Appointment.objects.filter(starts_at__isnull=False).order_by('starts_at')
+    first, last = bounds.first(), bounds.last()
+    if first is None:
+        return 0
+    start, end = timezone.localdate(first.starts_at), timezone.localdate(last.starts_at)
+    RevenueSummary.objects.exclude(date__range=(start, end)).delete()
+    rows = 0
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        rows += rebuild_days(date_range(start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+    RevenueDirtyDay.objects.all().delete()
+    return rows
+
+
+def revenue_report(start_date, end_date, by='staff'):
+    refresh_dirty(start_date, end_date)
+    field = GROUPS[by]
+    return list(
+        RevenueSummary.objects.filter(date__range=(start_date, end_date))
+        .values(field)
+        .annotate(
+            rows=Count('id'),
+            appointments=Sum('appointments'), paid_appointments=Sum('paid_appointments'),
+            revenue=Sum('revenue'), paid_revenue=Sum('paid_revenue'),
+            booked_minutes=Sum('booked_minutes'),
+        )
+        .order_by(field)
+    )
+
+
+def utilization(start_date, end_date, staff_ids=None):
+    # booked minutes / working minutes from the weekly TimeSlot templates,
+    # excluding active holidays
+    refresh_dirty(start_date, end_date)
+    booked = dict(
+        RevenueSummary.objects.filter(date__range=(start_date, end_date))
+        .values('staff_id').annotate(minutes=Sum('booked_minutes'))
+        .values_list('staff_id', 'minutes')
+    )
+    if staff_ids is None:
+        staff_ids = sorted(set(TimeSlot.objects.values_list('staff_id', flat=True)) | set(booked))
+
+    holidays = holiday_dates(start_date, end_date)
+    weekdays = defaultdict(int)
+    for day in date_range(start_date, end_date):
+        if day not in holidays:
+            weekdays[day.weekday()] += 1
+
+    report = {}
+    for staff_id, template in weekly_templates(staff_ids).items():
+        available = sum(template.get(weekday, 0).bit_count() * days for weekday, days in weekdays.items())
+        minutes = booked.get(staff_id) or 0
+        report[staff_id] = {
+            'booked_minutes': minutes,
+            'available_minutes': available,
+            'utilization': minutes / available if available else None,
+        }
+    return report
@@ -0,0 +1,280 @@
+import heapq
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from . import calendar_cache
+from .models import Appointment, Holiday, StaffDayAvailability, TimeSlot
+
+# Availability is computed on per-day minute bitmaps: bit ``m`` of a day's
+# bitmap is set when minute ``m`` (counted from midnight) is free. TimeSlot
+# weekdays follow ``date.weekday()`` (0 = Monday).
+
+MINUTES_PER_DAY = 24 * 60
+SLOT_STEP = 15
+DEFAULT_HORIZON_DAYS = 60
+CHUNK_DAYS = 7
+
+
+def minute_of(value):
+    return value.hour * 60 + value.minute
+
+
+def span(start, end):
+    end = min(end, MINUTES_PER_DAY)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+@lru_cache(maxsize=None)
+def grid(step):
+    bits = 0
+    for minute in range(0, MINUTES_PER_DAY, step):
+        bits |= 1 << minute
+    return bits
+
+
+def fitting_starts(bitmap, duration):
+    # Bit m of the result is set when minutes m .. m + duration - 1 are all free.
+    mask = bitmap
+    covered = 1
+    while covered < duration and mask:
+        shift = min(covered, duration - covered)
+        mask &= mask >> shift
+        covered += shift
+    return mask
+
+
+def iter_bits(bitmap):
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+def load_weekly_templates(staff_ids):
+    templates = {staff_id: {} for staff_id in staff_ids}
+    slots = TimeSlot.objects.filter(
+        staff_id__in=staff_ids, is_available=True,
+        start_time__isnull=False, end_time__isnull=False,
+    ).values_list('staff_id', 'weekday', 'start_time', 'end_time')
+    for staff_id, weekday, start, end in slots:
+        template = templates[staff_id]
+        template[weekday] = template.get(weekday, 0) | span(minute_of(start), minute_of(end))
+    return templates
+
+
+def load_holiday_dates():
+    return Holiday.objects.filter(is_active=True).values_list('date', flat=True)
+
+
+def weekly_templates(staff_ids):
+    return calendar_cache.templates(list(staff_ids), load_weekly_templates)
+
+
+def weekly_template(staff_id):
+    return weekly_templates([staff_id])[staff_id]
+
+
+def holiday_dates(start_date, end_date):
+    return {day for day in calendar_cache.holidays(load_holiday_dates) if start_date <= day <= end_date}
+
+
+def appointment_interval(starts_at, ends_at):
+    # (day, start_minute, end_minute) an appointment occupies on its local day
+    start = timezone.localtime(starts_at)
+    end = timezone.localtime(ends_at)
+    end_minute = minute_of(end) if end.date() == start.date() else MINUTES_PER_DAY
+    return start.date(), minute_of(start), end_minute
+
+
+def busy_bitmaps_by_staff(staff_ids, start_date, end_date):
+    busy = {}
+    rows = (
+        Appointment.objects.filter(staff_id__in=staff_ids).active()
+        .on_days(start_date, end_date)
+        .values_list('staff_id', 'starts_at', 'ends_at')
+    )
+    for staff_id, starts_at, ends_at in rows:
+        day, start, end = appointment_interval(starts_at, ends_at)
+        key = (staff_id, day)
+        busy[key] = busy.get(key, 0) | span(start, end)
+    return busy
+
+
+def busy_bitmaps(staff_id, start_date, end_date):
+    return {day: bits for (_, day), bits in busy_bitmaps_by_staff([staff_id], start_date, end_date).items()}
+
+
+def date_range(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+def compute_bitmaps(staff_ids, start_date, end_date, templates=None, holidays=None):
+    # {(staff_id, day): bitmap} for every staff member and day in the range,
+    # computed from scratch in at most three queries.
+    if templates is None:
+        templates = weekly_templates(staff_ids)
+    if holidays is None:
+        holidays = holiday_dates(start_date, end_date)
+    busy = busy_bitmaps_by_staff(staff_ids, start_date, end_date)
+    bitmaps = {}
+    for staff_id in staff_ids:
+        template = templates.get(staff_id, {})
+        for day in date_range(start_date, end_date):
+            bits = 0 if day in holidays else template.get(day.weekday(), 0)
+            bitmaps[staff_id, day] = bits & ~busy.get((staff_id, day), 0)
+    return bitmaps
+
+
+# Materialized availability: one StaffDayAvailability row per staff member
+# and day, rebuilt by the ``rebuild_availability`` command and patched by the
+# signal handlers in ``appointment.signals``. Days without a row fall back to
+# computing the bitmap from the source tables.
+
+BITMAP_BYTES = MINUTES_PER_DAY // 8
+
+
+def encode_bitmap(bitmap):
+    return bitmap.to_bytes(BITMAP_BYTES, 'little')
+
+
+def decode_bitmap(value):
+    return int.from_bytes(bytes(value), 'little')
+
+
+def stored_bitmaps(staff_id, start_date, end_date):
+    rows = StaffDayAvailability.objects.filter(
+        staff_id=staff_id, date__range=(start_date, end_date),
+    ).values_list('date', 'free_minutes')
+    return {day: decode_bitmap(value) for day, value in rows}
+
+
+def rebuild_availability(staff_ids, start_date, end_date, batch_size=500):
+    bitmaps = compute_bitmaps(staff_ids, start_date, end_date)
+    rows = [
+        StaffDayAvailability(staff_id=staff_id, date=day, free_minutes=encode_bitmap(bits))
+        for (staff_id, day), bits in bitmaps.items()
+    ]
+    with transaction.atomic():
+        StaffDayAvailability.objects.filter(
+            staff_id__in=staff_ids, date__range=(start_date, end_date),
+        ).delete()
+        StaffDayAvailability.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def refresh_stored(**filters):
+    # Recomputes the materialized rows matching ``filters``; days that were
+    # never materialized are left alone.
+    rows = list(StaffDayAvailability.objects.filter(**filters).only('id', 'staff_id', 'date'))
+    if not rows:
+        return 0
+    staff_ids = sorted({row.staff_id for row in rows})
+    bitmaps = compute_bitmaps(staff_ids, min(row.date for row in rows), max(row.date for row in rows))
+    now = timezone.now()
+    for row in rows:
+        row.free_minutes = encode_bitmap(bitmaps[row.staff_id, row.date])
+        row.updated_at = now
+    StaffDayAvailability.objects.bulk_update(rows, ['free_minutes', 'updated_at'], batch_size=500)
+    return len(rows)
+
+
+def occupy(staff_id, day, start_minute, end_minute):
+    with transaction.atomic():
+        row = (
+            StaffDayAvailability.objects.select_for_update()
+            .filter(staff_id=staff_id, date=day).first()
+        )
+        if row is None:
+            return
+        row.free_minutes = encode_bitmap(decode_bitmap(row.free_minutes) & ~span(start_minute, end_minute))
+        row.save(update_fields=['free_minutes', 'updated_at'])
+
+
+def slot_starts(day, bitmap, duration, step=SLOT_STEP, not_before=None):
+    tz = timezone.get_current_timezone()
+    for minute in iter_bits(fitting_starts(bitmap, duration) & grid(step)):
+        start = timezone.make_aware(datetime.combine(day, time(minute // 60, minute % 60)), tz)
+        if not_before is None or start >= not_before:
+            yield start
+
+
+def iter_available_slots(staff, service, start_date, end_date=None, step=SLOT_STEP,
+                         not_before=None, chunk_days=CHUNK_DAYS, template=None, holidays=None):
+    # Lazily yields free start times in order. Each chunk of days is one
+    # lookup on the materialized table; only chunks with missing days cost
+    # the template, holiday and appointment queries. Callers covering several
+    # staff members can pass a preloaded template and holiday set to share them.
+    if end_date is None:
+        end_date = start_date + timedelta(days=DEFAULT_HORIZON_DAYS)
+    if not_before is None:
+        not_before = timezone.now()
+
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        bitmaps = stored_bitmaps(staff.pk, chunk_start, chunk_end)
+
+        if len(bitmaps) <= (chunk_end - chunk_start).days:
+            if template is None:
+                template = weekly_template(staff.pk)
+            if not template and not bitmaps:
+                return
+            computed = compute_bitmaps([staff.pk], chunk_start, chunk_end,
+                                       {staff.pk: template}, holidays)
+            for day in date_range(chunk_start, chunk_end):
+                bitmaps.setdefault(day, computed[staff.pk, day])
+
+        for day in date_range(chunk_start, chunk_end):
+            if bitmaps[day]:
+                yield from slot_starts(day, bitmaps[day], service.duration, step, not_before)
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def get_available_slots(staff, service, start_date, end_date, step=SLOT_STEP, not_before=None):
+    days = (end_date - start_date).days + 1
+    return list(iter_available_slots(staff, service, start_date, end_date, step,
+                                     not_before, chunk_days=max(days, 1)))
+
+
+def next_available_slot(staff, service, after=None, horizon_days=DEFAULT_HORIZON_DAYS):
+    after = after or timezone.now()
+    start_date = timezone.localdate(after)
+    slots = iter_available_slots(staff, service, start_date,
+                                 start_date + timedelta(days=horizon_days), not_before=after)
+    return next(slots, None)
+
+
+def first_openings(service, count, after=None, horizon_days=DEFAULT_HORIZON_DAYS):
+    # Earliest ``count`` (start, staff) pairs across every active specialist
+    # for the service. Each staff member's calendar is only computed as far
+    # as the merge actually reads it.
+    after = after or timezone.now()
+    start_date = timezone.localdate(after)
+    end_date = start_date + timedelta(days=horizon_days)
+
+    staff_members = list(get_user_model().objects.filter(
+        staff_profile__specialties=service, staff_profile__is_active=True,
+    ).distinct())
+    if not staff_members:
+        return []
+    templates = weekly_templates([staff.pk for staff in staff_members])
+    holidays = holiday_dates(start_date, end_date)
+
+    def openings(staff):
+        for start in iter_available_slots(staff, service, start_date, end_date, not_before=after,
+                                          template=templates[staff.pk], holidays=holidays):
+            yield start, staff
+
+    merged = heapq.merge(*(openings(staff) for staff in staff_members),
+                         key=lambda opening: (opening[0], opening[1].pk))
+    return list(islice(merged, count))
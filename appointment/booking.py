@@ -0,0 +1,126 @@
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from beauty_salon_project import counters
+from user.stats import reservations_added
+
+from .analytics import mark_dirty
+from .availability import appointment_interval, busy_bitmaps_by_staff, refresh_stored, span
+from .models import Appointment, Service, StaffBookingLock, appointment_span
+
+BulkResult = namedtuple('BulkResult', ['created', 'rejected'])
+
+
+class BookingConflict(Exception):
+    pass
+
+
+def lock_staff(staff_id):
+    # Must run inside a transaction. The UPDATE takes the row lock on the
+    # staff member's lock row (and on SQLite the write lock) before any read,
+    # so bookings for one staff member are serialized while other staff
+    # members book in parallel.
+    if StaffBookingLock.objects.filter(staff_id=staff_id).update(version=F('version') + 1):
+        return
+    StaffBookingLock.objects.get_or_create(staff_id=staff_id)
+    StaffBookingLock.objects.filter(staff_id=staff_id).update(version=F('version') + 1)
+
+
+def is_free(staff_id, start, end):
+    return not Appointment.objects.filter(staff_id=staff_id).active().overlapping(start, end).exists()
+
+
+def book_appointment(customer, staff, service, start, **fields):
+    start = timezone.localtime(start)
+    end = start + timedelta(minutes=service.duration)
+
+    with transaction.atomic():
+        lock_staff(staff.pk)
+        if not is_free(staff.pk, start, end):
+            raise BookingConflict(f"{staff} is not free at {start:%Y-%m-%d %H:%M}")
+        appointment = Appointment(
+            customer=customer, staff=staff, service=service,
+            appointment_date=start, appointment_time=start.time(), end_time=end.time(),
+            **fields
+        )
+        appointment.save()
+        transaction.on_commit(lambda: counters.increment(Service, service.pk, 'booking_count'))
+    return appointment
+
+
+def bulk_book(rows, chunk_size=1000, strict=False):
+    # ``rows`` are dicts of Appointment field values keyed by attname
+    # (customer_id, staff_id, service_id, appointment_date, ...). Services
+    # are fetched once, end_time/total_price are filled in here, and rows
+    # overlapping an existing or earlier imported appointment of the same
+    # staff member are rejected in memory before anything is inserted.
+    # Returns BulkResult(created, rejected) where rejected lists row indexes.
+    rows = list(rows)
+    if not rows:
+        return BulkResult(0, [])
+
+    service_ids = {row['service_id'] for row in rows}
+    services = Service.objects.only('duration', 'price', 'discount_price').in_bulk(service_ids)
+    if len(services) != len(service_ids):
+        missing = ', '.join(str(pk) for pk in sorted(service_ids - services.keys()))
+        raise Service.DoesNotExist(f"unknown services: {missing}")
+    appointments = []
+    for row in rows:
+        appointment = Appointment(**row)
+        service = services[appointment.service_id]
+        if timezone.is_naive(appointment.appointment_date):
+            appointment.appointment_date = timezone.make_aware(appointment.appointment_date)
+        if appointment.appointment_time and not appointment.end_time:
+            start = datetime.combine(appointment.appointment_date, appointment.appointment_time)
+            appointment.end_time = (start + timedelta(minutes=service.duration)).time()
+        if not appointment.total_price:
+            appointment.total_price = service.get_final_price()
+        appointment.starts_at, appointment.ends_at = appointment_span(
+            appointment.appointment_date, appointment.appointment_time, appointment.end_time,
+            service.duration,
+        )
+        appointments.append(appointment)
+
+    intervals = [appointment_interval(a.starts_at, a.ends_at) for a in appointments]
+    staff_ids = sorted({a.staff_id for a in appointments})
+    first_day = min(day for day, _, _ in intervals)
+    last_day = max(day for day, _, _ in intervals)
+
+    with transaction.atomic():
+        for staff_id in staff_ids:
+            lock_staff(staff_id)
+        busy = busy_bitmaps_by_staff(staff_ids, first_day, last_day)
+
+        accepted, rejected = [], []
+        for index, (appointment, (day, start, end)) in enumerate(zip(appointments, intervals)):
+            if appointment.status in Appointment.INACTIVE_STATUSES:
+                accepted.append(appointment)
+                continue
+            key = (appointment.staff_id, day)
+            bits = span(start, end)
+            if busy.get(key, 0) & bits:
+                rejected.append(index)
+                continue
+            busy[key] = busy.get(key, 0) | bits
+            accepted.append(appointment)
+
+        if strict and rejected:
+            raise BookingConflict(f"{len(rejected)} appointments overlap existing bookings")
+
+        Appointment.objects.bulk_create(accepted, batch_size=chunk_size)
+        booked = Counter(a.service_id for a in accepted if a.status not in Appointment.INACTIVE_STATUSES)
+
+        def count_bookings():
+            for service_id, count in booked.items():
+                counters.increment(Service, service_id, 'booking_count', count)
+        transaction.on_commit(count_bookings)
+        reservations_added(accepted)
+        # bulk_create skips the signal handlers that patch the materialized table
+        refresh_stored(staff_id__in=staff_ids, date__range=(first_day, last_day))
+        mark_dirty(day for day, _, _ in intervals)
+
+    return BulkResult(len(accepted), rejected)
@@ -0,0 +1,58 @@
+import threading
+
+from django.db import transaction
+
+from beauty_salon_project.versions import SharedVersion
+
+# Process-local copies of the holiday dates and each staff member's compiled
+# weekly template (weekday -> free-minute bitmap). Every worker compares its
+# copy against a version key in the shared Django cache (see
+# beauty_salon_project.versions); the signal handlers bump that key
+# whenever a Holiday or TimeSlot changes.
+
+VERSION_KEY = 'appointment:calendar-cache-version'
+
+shared_version = SharedVersion(VERSION_KEY)
+_lock = threading.Lock()
+_state = {'version': None, 'holidays': None, 'templates': {}}
+
+
+def current_version():
+    return shared_version.get()
+
+
+def _bump():
+    shared_version.bump()
+    with _lock:
+        _state.update(version=None, holidays=None, templates={})
+
+
+def invalidate():
+    # bump now so this process reloads inside the current transaction, and
+    # again after commit so other workers cannot keep a pre-commit copy
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def _fresh_state():
+    version = current_version()
+    with _lock:
+        if _state['version'] != version:
+            _state.update(version=version, holidays=None, templates={})
+        return _state
+
+
+def holidays(load):
+    state = _fresh_state()
+    if state['holidays'] is None:
+        state['holidays'] = frozenset(load())
+    return state['holidays']
+
+
+def templates(staff_ids, load):
+    state = _fresh_state()
+    cached = state['templates']
+    missing = [staff_id for staff_id in staff_ids if staff_id not in cached]
+    if missing:
+        cached.update(load(missing))
+    return {staff_id: cached[staff_id] for staff_id in staff_ids}
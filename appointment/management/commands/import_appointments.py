@@ -0,0 +1,79 @@
+import csv
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime, parse_time
+
+from appointment.booking import BookingConflict, bulk_book
+from appointment.models import Service
+
+# CSV columns; customer, staff, service and appointment_date are required
+COLUMNS = {
+    'customer': ('customer_id', int),
+    'staff': ('staff_id', int),
+    'service': ('service_id', int),
+    'appointment_date': ('appointment_date', parse_datetime),
+    'appointment_time': ('appointment_time', parse_time),
+    'end_time': ('end_time', parse_time),
+    'status': ('status', str),
+    'total_price': ('total_price', int),
+    'is_paid': ('is_paid', lambda value: value.lower() in ('1', 'true', 'yes')),
+    'payment_method': ('payment_method', str),
+    'notes': ('notes', str),
+}
+
+
+def parse_rows(reader):
+    for line, record in enumerate(reader, start=2):
+        row = {}
+        for column, value in record.items():
+            if column not in COLUMNS or value in ('', None):
+                continue
+            field, parse = COLUMNS[column]
+            try:
+                row[field] = parse(value)
+                # the dateparse helpers return None for strings that are not dates at all
+                if row[field] is None:
+                    raise ValueError(value)
+            except ValueError as error:
+                raise CommandError(f"line {line}: bad {column} {value!r}") from error
+        yield row
+
+
+class Command(BaseCommand):
+    help = 'Bulk import appointments from a CSV file, committing one chunk at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='rows per transaction')
+        parser.add_argument('--strict', action='store_true',
+                            help='stop at the first chunk with an overlapping row; earlier chunks stay imported')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        created, rejected = 0, []
+        with open(options['path'], newline='', encoding='utf-8') as handle:
+            reader = csv.DictReader(handle)
+            missing = {'customer', 'staff', 'service', 'appointment_date'} - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(f"missing columns: {', '.join(sorted(missing))}")
+            rows = parse_rows(reader)
+            offset = 0
+            while chunk := list(islice(rows, chunk_size)):
+                try:
+                    result = bulk_book(chunk, chunk_size=chunk_size, strict=options['strict'])
+                except (BookingConflict, Service.DoesNotExist) as error:
+                    raise CommandError(
+                        f"lines {offset + 2}-{offset + len(chunk) + 1}: {error} "
+                        f"({created} appointments imported before them)"
+                    ) from error
+                created += result.created
+                rejected.extend(offset + index for index in result.rejected)
+                offset += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {created} appointments'))
+        if rejected:
+            lines = ', '.join(str(index + 2) for index in rejected[:20])
+            self.stdout.write(self.style.WARNING(
+                f'Skipped {len(rejected)} overlapping rows (lines {lines}{"..." if len(rejected) > 20 else ""})'
+            ))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from appointment.availability import rebuild_availability
+from appointment.models import StaffDayAvailability, TimeSlot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized per-staff daily availability table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=60, help='number of days to materialize from today')
+        parser.add_argument('--staff', type=int, nargs='*', help='only rebuild these staff ids')
+
+    def handle(self, *args, **options):
+        start_date = timezone.localdate()
+        end_date = start_date + timedelta(days=options['days'] - 1)
+
+        staff_ids = options['staff']
+        if not staff_ids:
+            staff_ids = sorted(
+                set(TimeSlot.objects.values_list('staff_id', flat=True))
+                | set(StaffDayAvailability.objects.values_list('staff_id', flat=True))
+            )
+            StaffDayAvailability.objects.filter(date__lt=start_date).delete()
+
+        count = rebuild_availability(staff_ids, start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(
+            f'Materialized {count} staff days ({start_date} to {end_date}) for {len(staff_ids)} staff'
+        ))
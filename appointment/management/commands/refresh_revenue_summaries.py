@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from appointment.analytics import rebuild_all, rebuild_days, refresh_dirty
+from appointment.availability import date_range
+
+
+class Command(BaseCommand):
+    help = 'Re-aggregate the daily revenue summaries (dirty days only by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='rebuild every day that has appointments')
+        parser.add_argument('--start', type=date.fromisoformat, help='rebuild from this date (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='rebuild up to this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            rows = rebuild_all()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} summary rows'))
+            return
+        if options['start']:
+            end_date = options['end'] or options['start']
+            rows = rebuild_days(date_range(options['start'], end_date))
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {rows} summary rows ({options["start"]} to {end_date})'
+            ))
+            return
+        days = refresh_dirty()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {days} dirty days'))
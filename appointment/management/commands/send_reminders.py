@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from appointment.reminders import CLAIM_LEASE, dispatch_reminders
+
+
+class Command(BaseCommand):
+    help = 'Send reminders for upcoming appointments; safe to run in several processes at once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-hours', type=float, default=24,
+                            help='remind appointments starting within this many hours')
+        parser.add_argument('--chunk-size', type=int, default=200)
+        parser.add_argument('--lease-minutes', type=float, default=CLAIM_LEASE.total_seconds() / 60,
+                            help='retake claims left unconfirmed this long by a crashed run')
+        parser.add_argument('--loop', action='store_true', help='keep running and poll for new work')
+        parser.add_argument('--interval', type=float, default=60, help='seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        window = timedelta(hours=options['window_hours'])
+        lease = timedelta(minutes=options['lease_minutes'])
+        while True:
+            sent = dispatch_reminders(window, options['chunk_size'], lease=lease)
+            self.stdout.write(f'Sent {sent} reminders')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
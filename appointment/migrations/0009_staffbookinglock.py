@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0008_remove_service_image_remove_servicecategory_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffBookingLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='version')),
+                ('staff', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='booking_lock', to=settings.AUTH_USER_MODEL, verbose_name='staff')),
+            ],
+            options={
+                'verbose_name': 'staff booking lock',
+                'verbose_name_plural': 'staff booking locks',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0009_staffbookinglock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffDayAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('free_minutes', models.BinaryField(max_length=180, verbose_name='free minutes')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_availability', to=settings.AUTH_USER_MODEL, verbose_name='staff')),
+            ],
+            options={
+                'verbose_name': 'staff day availability',
+                'verbose_name_plural': 'staff day availability',
+                'ordering': ['date'],
+                'unique_together': {('staff', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0010_staffdayavailability'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='reminder_claim',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32, verbose_name='reminder claim'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('reminder_sent', False)), fields=['appointment_date'], name='appointment_reminder_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('reminder_claim', ''), _negated=True), fields=['reminder_claim'], name='appointment_reminder_claim_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+from django.db import migrations
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+
+
+def span(appointment_date, appointment_time, end_time, duration):
+    # frozen copy of appointment.models.appointment_span
+    if timezone.is_aware(appointment_date):
+        appointment_date = timezone.localtime(appointment_date)
+    else:
+        appointment_date = timezone.make_aware(appointment_date)
+    if appointment_time:
+        starts_at = timezone.make_aware(datetime.combine(appointment_date.date(), appointment_time))
+    else:
+        starts_at = appointment_date
+    if end_time:
+        ends_at = timezone.make_aware(datetime.combine(starts_at.date(), end_time))
+        if ends_at <= starts_at:
+            ends_at += timedelta(days=1)
+    else:
+        ends_at = starts_at + timedelta(minutes=duration or 0)
+    return starts_at, ends_at
+
+
+def backfill_starts_at(apps, schema_editor):
+    Appointment = apps.get_model('appointment', 'Appointment')
+    Service = apps.get_model('appointment', 'Service')
+    durations = dict(Service.objects.values_list('id', 'duration'))
+
+    pending = (
+        Appointment.objects.filter(starts_at__isnull=True)
+        .only('id', 'service_id', 'appointment_date', 'appointment_time', 'end_time')
+    )
+    batch = []
+    for appointment in pending.iterator(chunk_size=BATCH_SIZE):
+        appointment.starts_at, appointment.ends_at = span(
+            appointment.appointment_date, appointment.appointment_time,
+            appointment.end_time, durations.get(appointment.service_id),
+        )
+        batch.append(appointment)
+        if len(batch) >= BATCH_SIZE:
+            Appointment.objects.bulk_update(batch, ['starts_at', 'ends_at'])
+            batch = []
+    if batch:
+        Appointment.objects.bulk_update(batch, ['starts_at', 'ends_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0012_appointment_starts_at_ends_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_starts_at, migrations.RunPython.noop),
+    ]
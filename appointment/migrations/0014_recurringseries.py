@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0013_backfill_appointment_starts_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('weekly', 'weekly'), ('biweekly', 'biweekly')], default='weekly', max_length=20, verbose_name='frequency')),
+                ('start_date', models.DateField(verbose_name='start date')),
+                ('start_time', models.TimeField(verbose_name='start time')),
+                ('occurrences', models.PositiveIntegerField(verbose_name='occurrences')),
+                ('on_conflict', models.CharField(choices=[('skip', 'skip'), ('shift', 'shift')], default='skip', max_length=20, verbose_name='on conflict')),
+                ('skip_holidays', models.BooleanField(default=True, verbose_name='skip holidays')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_as_customer', to=settings.AUTH_USER_MODEL, verbose_name='customer')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointment.service', verbose_name='service')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_as_staff', to=settings.AUTH_USER_MODEL, verbose_name='staff')),
+            ],
+            options={
+                'verbose_name': 'recurring series',
+                'verbose_name_plural': 'recurring series',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointments', to='appointment.recurringseries', verbose_name='series'),
+        ),
+    ]
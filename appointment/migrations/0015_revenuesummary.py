@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0014_recurringseries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='date')),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='marked at')),
+            ],
+            options={
+                'verbose_name': 'revenue dirty day',
+                'verbose_name_plural': 'revenue dirty days',
+            },
+        ),
+        migrations.CreateModel(
+            name='RevenueSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('payment_method', models.CharField(blank=True, max_length=20, verbose_name='payment method')),
+                ('appointments', models.PositiveIntegerField(default=0, verbose_name='appointments')),
+                ('paid_appointments', models.PositiveIntegerField(default=0, verbose_name='paid appointments')),
+                ('revenue', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='revenue')),
+                ('paid_revenue', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='paid revenue')),
+                ('booked_minutes', models.PositiveIntegerField(default=0, verbose_name='booked minutes')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_summaries', to='appointment.service', verbose_name='service')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_summaries', to=settings.AUTH_USER_MODEL, verbose_name='staff')),
+            ],
+            options={
+                'verbose_name': 'revenue summary',
+                'verbose_name_plural': 'revenue summaries',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='appointment_date_7b442c_idx')],
+                'unique_together': {('date', 'staff', 'service', 'payment_method')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0015_revenuesummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='trend_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='trend score'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['is_active', '-trend_score'], name='appointment_is_acti_f0dc28_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['category', 'is_active', '-trend_score'], name='appointment_categor_037bf8_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:21
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_open_claims(apps, schema_editor):
+    # claims open at upgrade time were stamped with reminder_sent_at
+    Appointment = apps.get_model('appointment', 'Appointment')
+    Appointment.objects.exclude(reminder_claim='').update(reminder_claimed_at=F('reminder_sent_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0016_trend_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='reminder_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='reminder claimed at'),
+        ),
+        migrations.RunPython(stamp_open_claims, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:25
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0017_appointment_reminder_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recurringseries',
+            name='occurrences',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='occurrences'),
+        ),
+    ]
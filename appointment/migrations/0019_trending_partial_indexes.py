@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0018_recurringseries_occurrences_min'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='service',
+            name='appointment_is_acti_f0dc28_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='service',
+            name='appointment_categor_037bf8_idx',
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-trend_score'], name='service_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-trend_score'], name='service_category_trending_idx'),
+        ),
+    ]
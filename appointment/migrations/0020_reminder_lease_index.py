@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0019_trending_partial_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('reminder_claim', ''), _negated=True), fields=['starts_at'], name='appointment_reminder_lease_idx'),
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator , RegexValidator
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 
 hex_color_validator = RegexValidator(
     regex=r'^[0-9A-Fa-f]{6}$',
@@ -48,6 +48,7 @@ class Service(models.Model):
     #count
     view_count = models.PositiveIntegerField(default=0,verbose_name='view count')
     booking_count = models.PositiveIntegerField(default=0,verbose_name='booking count')
+    trend_score = models.FloatField(default=0,editable=False,verbose_name='trend score')
     rating = models.DecimalField(decimal_places=0,max_digits=10,blank=True,null=True,verbose_name='rating')
 
 
@@ -61,6 +62,13 @@ class Service(models.Model):
         ordering = ['-created_at']
         verbose_name = 'service'
         verbose_name_plural = 'services'
+        indexes = [
+            # trending top-K; partial because the ORM emits a bare "WHERE is_active"
+            models.Index(fields=['-trend_score'], condition=models.Q(is_active=True),
+                         name='service_trending_idx'),
+            models.Index(fields=['category', '-trend_score'], condition=models.Q(is_active=True),
+                         name='service_category_trending_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.category.name}"
@@ -76,6 +84,44 @@ class Service(models.Model):
             return round(discount)
         return 0
 
+def appointment_span(appointment_date, appointment_time, end_time, duration=None):
+    # absolute (starts_at, ends_at) for the split date/time columns
+    if timezone.is_aware(appointment_date):
+        appointment_date = timezone.localtime(appointment_date)
+    else:
+        appointment_date = timezone.make_aware(appointment_date)
+    if appointment_time:
+        starts_at = timezone.make_aware(datetime.combine(appointment_date.date(), appointment_time))
+    else:
+        starts_at = appointment_date
+    if end_time:
+        ends_at = timezone.make_aware(datetime.combine(starts_at.date(), end_time))
+        if ends_at <= starts_at:
+            ends_at += timedelta(days=1)
+    else:
+        ends_at = starts_at + timedelta(minutes=duration or 0)
+    return starts_at, ends_at
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class AppointmentQuerySet(models.QuerySet):
+
+    def active(self):
+        return self.exclude(status__in=Appointment.INACTIVE_STATUSES)
+
+    def starting_between(self, start, end):
+        return self.filter(starts_at__gte=start, starts_at__lt=end)
+
+    def on_days(self, start_date, end_date):
+        return self.starting_between(day_start(start_date), day_start(end_date + timedelta(days=1)))
+
+    def overlapping(self, start, end):
+        return self.filter(starts_at__lt=end, ends_at__gt=start)
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = (
         ('pending','pending'),
@@ -93,13 +139,23 @@ class Appointment(models.Model):
         ('online','online'),
         ('wallet','wallet'),
     )
+
+    # statuses that no longer hold the staff member's time
+    INACTIVE_STATUSES = ('cancelled', 'rejected', 'no_show')
+    # statuses that do not count as a reservation the customer made
+    VOID_STATUSES = ('cancelled', 'rejected')
+
     customer = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,verbose_name='customer',related_name='appointments_as_customer')
     staff = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,verbose_name='staff',related_name='appointments_as_staff')
     service = models.ForeignKey(Service,on_delete=models.CASCADE,verbose_name='service')
+    series = models.ForeignKey('RecurringSeries',on_delete=models.SET_NULL,blank=True,null=True,related_name='appointments',verbose_name='series')
 
     appointment_date = models.DateTimeField(default=timezone.now,verbose_name='appointment date')
     appointment_time = models.TimeField(blank=True,null=True,verbose_name='appointment time')
     end_time = models.TimeField(blank=True,null=True,verbose_name='end time')
+    # denormalized from the three fields above in save()
+    starts_at = models.DateTimeField(blank=True,null=True,editable=False,verbose_name='starts at')
+    ends_at = models.DateTimeField(blank=True,null=True,editable=False,verbose_name='ends at')
 
     notes = models.TextField(blank=True,verbose_name='notes')
     staff_notes = models.TextField(blank=True,verbose_name='staff notes')
@@ -113,11 +169,15 @@ class Appointment(models.Model):
 
     reminder_sent = models.BooleanField(default=False,verbose_name='reminder sent')
     reminder_sent_at = models.DateTimeField(blank=True,null=True,verbose_name='reminder sent at')
+    reminder_claim = models.CharField(max_length=32,blank=True,default='',editable=False,verbose_name='reminder claim')
+    reminder_claimed_at = models.DateTimeField(blank=True,null=True,editable=False,verbose_name='reminder claimed at')
 
     created_at = models.DateTimeField(auto_now_add=True,verbose_name='created at')
     updated_at = models.DateTimeField(auto_now=True,verbose_name='updated at')
     cancelled_at = models.DateTimeField(blank=True,null=True,verbose_name='cancelled at')
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'appointment'
         verbose_name_plural = 'appointments'
@@ -127,11 +187,27 @@ class Appointment(models.Model):
             models.Index(fields=['appointment_date', 'appointment_time']),
             models.Index(fields=['customer', 'status']),
             models.Index(fields=['staff', 'appointment_date']),
+            models.Index(fields=['staff', 'starts_at', 'ends_at']),
+            models.Index(fields=['starts_at']),
+            models.Index(fields=['starts_at'], condition=models.Q(reminder_sent=False),
+                         name='appointment_reminder_due_idx'),
+            models.Index(fields=['reminder_claim'], condition=~models.Q(reminder_claim=''),
+                         name='appointment_reminder_claim_idx'),
+            # open claims by start, for finding expired leases
+            models.Index(fields=['starts_at'], condition=~models.Q(reminder_claim=''),
+                         name='appointment_reminder_lease_idx'),
         ]
 
     def __str__(self):
         return f"{self.customer.get_full_name()} - {self.service.name} - {self.appointment_date}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # kept so signal handlers can tell what a save actually changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.end_time and self.appointment_time:
 
@@ -141,14 +217,23 @@ class Appointment(models.Model):
 
         if not self.total_price:
             self.total_price = self.service.get_final_price()
+
+        self.starts_at, self.ends_at = appointment_span(
+            self.appointment_date, self.appointment_time, self.end_time,
+            None if self.end_time else self.service.duration,
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'appointment_date', 'appointment_time', 'end_time'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'starts_at', 'ends_at'}
         super().save(*args, **kwargs)
+        # post_save handlers have seen the old values by now
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
 
     def can_cancel(self):
         if self.status in ['cancelled', 'completed', 'no_show']:
             return False
 
-        appointment_datetime = datetime.combine(self.appointment_date, self.appointment_time)
-        if appointment_datetime < timezone.now():
+        if self.starts_at and self.starts_at < timezone.now():
             return False
 
         return True
@@ -164,6 +249,75 @@ class Appointment(models.Model):
         }
         return status_classes.get(self.status, 'secondary')
 
+class RecurringSeries(models.Model):
+    FREQUENCY_CHOICES = (
+        ('weekly','weekly'),
+        ('biweekly','biweekly'),
+    )
+
+    CONFLICT_CHOICES = (
+        ('skip','skip'),
+        ('shift','shift'),
+    )
+
+    FREQUENCY_DAYS = {'weekly': 7, 'biweekly': 14}
+
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,related_name='series_as_customer',verbose_name='customer')
+    staff = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,related_name='series_as_staff',verbose_name='staff')
+    service = models.ForeignKey(Service,on_delete=models.CASCADE,verbose_name='service')
+
+    frequency = models.CharField(max_length=20,choices=FREQUENCY_CHOICES,default='weekly',verbose_name='frequency')
+    start_date = models.DateField(verbose_name='start date')
+    start_time = models.TimeField(verbose_name='start time')
+    occurrences = models.PositiveIntegerField(validators=[MinValueValidator(1)],verbose_name='occurrences')
+    on_conflict = models.CharField(max_length=20,choices=CONFLICT_CHOICES,default='skip',verbose_name='on conflict')
+    skip_holidays = models.BooleanField(default=True,verbose_name='skip holidays')
+
+    created_at = models.DateTimeField(auto_now_add=True,verbose_name='created at')
+    updated_at = models.DateTimeField(auto_now=True,verbose_name='updated at')
+
+    class Meta:
+        verbose_name = 'recurring series'
+        verbose_name_plural = 'recurring series'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.customer_id} - {self.service_id} - {self.get_frequency_display()} from {self.start_date}"
+
+    def occurrence_dates(self):
+        step = timedelta(days=self.FREQUENCY_DAYS[self.frequency])
+        return [self.start_date + step * index for index in range(self.occurrences)]
+
+
+class StaffBookingLock(models.Model):
+    staff = models.OneToOneField(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,related_name='booking_lock',verbose_name='staff')
+    version = models.PositiveBigIntegerField(default=0,verbose_name='version')
+
+    class Meta:
+        verbose_name = 'staff booking lock'
+        verbose_name_plural = 'staff booking locks'
+
+    def __str__(self):
+        return f"lock {self.staff_id} ({self.version})"
+
+
+class StaffDayAvailability(models.Model):
+    # free_minutes is a 1440-bit little-endian bitmap, bit m = minute m of the day is free
+    staff = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,related_name='day_availability',verbose_name='staff')
+    date = models.DateField(verbose_name='date')
+    free_minutes = models.BinaryField(max_length=180,verbose_name='free minutes')
+    updated_at = models.DateTimeField(auto_now=True,verbose_name='updated at')
+
+    class Meta:
+        verbose_name = 'staff day availability'
+        verbose_name_plural = 'staff day availability'
+        ordering = ['date']
+        unique_together = ('staff', 'date')
+
+    def __str__(self):
+        return f"{self.staff_id} - {self.date}"
+
+
 class TimeSlot(models.Model):
     WEEKDAYS_CHOICES = (
         ('Monday','Monday'),
@@ -203,4 +357,42 @@ class Holiday(models.Model):
         ordering = ['date']
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class RevenueSummary(models.Model):
+    # one row per day, staff, service and payment method; see appointment.analytics
+    date = models.DateField(verbose_name='date')
+    staff = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,related_name='revenue_summaries',verbose_name='staff')
+    service = models.ForeignKey(Service,on_delete=models.CASCADE,related_name='revenue_summaries',verbose_name='service')
+    payment_method = models.CharField(max_length=20,blank=True,verbose_name='payment method')
+
+    appointments = models.PositiveIntegerField(default=0,verbose_name='appointments')
+    paid_appointments = models.PositiveIntegerField(default=0,verbose_name='paid appointments')
+    revenue = models.DecimalField(decimal_places=0,max_digits=14,default=0,verbose_name='revenue')
+    paid_revenue = models.DecimalField(decimal_places=0,max_digits=14,default=0,verbose_name='paid revenue')
+    booked_minutes = models.PositiveIntegerField(default=0,verbose_name='booked minutes')
+    updated_at = models.DateTimeField(auto_now=True,verbose_name='updated at')
+
+    class Meta:
+        verbose_name = 'revenue summary'
+        verbose_name_plural = 'revenue summaries'
+        ordering = ['-date']
+        unique_together = ('date', 'staff', 'service', 'payment_method')
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.staff_id} - {self.service_id}: {self.revenue}"
+
+
+class RevenueDirtyDay(models.Model):
+    date = models.DateField(unique=True,verbose_name='date')
+    marked_at = models.DateTimeField(default=timezone.now,verbose_name='marked at')
+
+    class Meta:
+        verbose_name = 'revenue dirty day'
+        verbose_name_plural = 'revenue dirty days'
+
+    def __str__(self):
+        return str(self.date)
@@ -0,0 +1,97 @@
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from beauty_salon_project import counters
+from user.stats import reservations_added
+
+from .analytics import mark_dirty
+from .availability import (
+    SLOT_STEP, busy_bitmaps, fitting_starts, grid, holiday_dates, minute_of, refresh_stored,
+    span, weekly_template,
+)
+from .booking import lock_staff
+from .models import Appointment, RecurringSeries, Service, appointment_span
+
+SeriesResult = namedtuple('SeriesResult', ['series', 'appointments', 'skipped'])
+
+
+def find_shifted_start(day, last_day, start_minute, duration, template, holidays, busy, step=SLOT_STEP):
+    # earliest free start at or after the requested time, moving on to the
+    # following days (up to last_day) when the requested day is full
+    while day <= last_day:
+        free = 0 if day in holidays else template.get(day.weekday(), 0) & ~busy.get(day, 0)
+        starts = fitting_starts(free, duration) & grid(step) & ~span(0, start_minute)
+        if starts:
+            return day, (starts & -starts).bit_length() - 1
+        day += timedelta(days=1)
+        start_minute = 0
+    return None
+
+
+def create_series(customer, staff, service, start_date, start_time, occurrences,
+                  frequency='weekly', on_conflict='skip', skip_holidays=True, **fields):
+    # All occurrences are checked against one range query of the staff
+    # calendar and inserted with a single bulk_create. Returns
+    # SeriesResult(series, appointments, skipped) where skipped lists the
+    # dates that could not be booked. When no date could be booked nothing
+    # is saved and series is None.
+    if occurrences < 1:
+        raise ValueError('a series needs at least one occurrence')
+    series = RecurringSeries(
+        customer=customer, staff=staff, service=service, frequency=frequency,
+        start_date=start_date, start_time=start_time, occurrences=occurrences,
+        on_conflict=on_conflict, skip_holidays=skip_holidays,
+    )
+    dates = series.occurrence_dates()
+    step = timedelta(days=RecurringSeries.FREQUENCY_DAYS[frequency])
+    first_day, last_day = dates[0], dates[-1] + step - timedelta(days=1)
+    start_minute = minute_of(start_time)
+    duration = service.duration
+
+    with transaction.atomic():
+        lock_staff(staff.pk)
+        busy = busy_bitmaps(staff.pk, first_day, last_day)
+        holidays = holiday_dates(first_day, last_day) if skip_holidays else set()
+        template = weekly_template(staff.pk) if on_conflict == 'shift' else {}
+
+        appointments, skipped = [], []
+        for day in dates:
+            minute = start_minute
+            bits = span(minute, minute + duration)
+            if day in holidays or busy.get(day, 0) & bits:
+                shifted = None
+                if on_conflict == 'shift':
+                    shifted = find_shifted_start(day, day + step - timedelta(days=1), minute,
+                                                 duration, template, holidays, busy)
+                if shifted is None:
+                    skipped.append(day)
+                    continue
+                day, minute = shifted
+                bits = span(minute, minute + duration)
+            busy[day] = busy.get(day, 0) | bits
+
+            start = timezone.make_aware(datetime.combine(day, time(minute // 60, minute % 60)))
+            end = start + timedelta(minutes=duration)
+            appointment = Appointment(
+                customer=customer, staff=staff, service=service, series=series,
+                appointment_date=start, appointment_time=start.time(), end_time=end.time(),
+                total_price=service.get_final_price(), **fields
+            )
+            appointment.starts_at, appointment.ends_at = appointment_span(
+                start, appointment.appointment_time, appointment.end_time)
+            appointments.append(appointment)
+
+        if not appointments:
+            return SeriesResult(None, [], skipped)
+        series.save()
+        Appointment.objects.bulk_create(appointments)
+        transaction.on_commit(lambda: counters.increment(
+            Service, service.pk, 'booking_count', len(appointments)))
+        reservations_added(appointments)
+        refresh_stored(staff_id=staff.pk, date__range=(first_day, last_day))
+        mark_dirty(timezone.localdate(a.starts_at) for a in appointments)
+
+    return SeriesResult(series, appointments, skipped)
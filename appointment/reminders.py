@@ -0,0 +1,122 @@
+import logging
+import sys
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Appointment
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'appointment.reminders.ConsoleReminderBackend'
+REMINDABLE_STATUSES = ('pending', 'confirmed')
+# how long a claim may stay unconfirmed before another run takes it over
+CLAIM_LEASE = timedelta(minutes=15)
+
+
+class BaseReminderBackend:
+
+    def send(self, appointment):
+        raise NotImplementedError
+
+
+class ConsoleReminderBackend(BaseReminderBackend):
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, appointment):
+        self.stream.write(f"{reminder_text(appointment)}\n")
+
+
+class LocmemReminderBackend(BaseReminderBackend):
+    # keeps sent reminders in memory, for tests and local development
+    outbox = []
+
+    def send(self, appointment):
+        self.outbox.append((appointment.pk, reminder_text(appointment)))
+
+
+def get_backend():
+    return import_string(getattr(settings, 'APPOINTMENT_REMINDER_BACKEND', DEFAULT_BACKEND))()
+
+
+def reminder_text(appointment):
+    start = timezone.localtime(appointment.starts_at)
+    return (f"{appointment.customer.get_full_name()}: reminder for {appointment.service.name} "
+            f"with {appointment.staff.get_full_name()} on {start:%Y-%m-%d} at {start:%H:%M}")
+
+
+def claimable(now, lease=CLAIM_LEASE):
+    # never claimed, or claimed by a worker that died before confirming
+    return Q(reminder_sent=False) | (~Q(reminder_claim='') & Q(reminder_claimed_at__lt=now - lease))
+
+
+def due_reminders(window, now=None, lease=CLAIM_LEASE):
+    # (pk, starts_at) of due appointments, soonest first. The two halves of
+    # claimable() are separate queries so each reads its partial index; as
+    # one OR, SQLite scans the whole window on the plain starts_at index.
+    now = now or timezone.now()
+    due = Appointment.objects.filter(starts_at__range=(now, now + window), status__in=REMINDABLE_STATUSES).order_by()
+    unsent = due.filter(reminder_sent=False)
+    expired = due.filter(~Q(reminder_claim=''), reminder_claimed_at__lt=now - lease)
+    return unsent.values_list('pk', 'starts_at').union(expired.values_list('pk', 'starts_at')).order_by('starts_at')
+
+
+def claim_reminders(window, chunk_size, now=None, lease=CLAIM_LEASE):
+    # One conditional UPDATE claims up to ``chunk_size`` due appointments.
+    # A claim restamps reminder_claimed_at, so rows another worker claimed
+    # first no longer match and concurrent workers never get the same
+    # appointment. A claim that is not confirmed within ``lease`` (the
+    # worker crashed between claim and send) becomes claimable again, so
+    # delivery is at least once.
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    candidates = [pk for pk, starts_at in due_reminders(window, now, lease)[:chunk_size]]
+    claimed = Appointment.objects.filter(claimable(now, lease), pk__in=candidates).update(
+        reminder_sent=True, reminder_claimed_at=now, reminder_claim=token,
+    )
+    return token, claimed
+
+
+def dispatch_reminders(window=timedelta(hours=24), chunk_size=200, backend=None, lease=CLAIM_LEASE):
+    backend = backend or get_backend()
+    sent = 0
+    while True:
+        token, claimed = claim_reminders(window, chunk_size, lease=lease)
+        if not claimed:
+            return sent
+
+        failed = []
+        appointments = (
+            Appointment.objects.filter(reminder_claim=token)
+            .select_related('customer', 'staff', 'service')
+        )
+        for appointment in appointments:
+            try:
+                backend.send(appointment)
+            except Exception:
+                logger.exception('sending reminder for appointment %s failed', appointment.pk)
+                failed.append(appointment.pk)
+            else:
+                sent += 1
+
+        with transaction.atomic():
+            if failed:
+                Appointment.objects.filter(pk__in=failed, reminder_claim=token).update(
+                    reminder_sent=False, reminder_claim='', reminder_claimed_at=None,
+                )
+            # confirming clears the token; a run that outlived its lease
+            # and was taken over confirms nothing here
+            Appointment.objects.filter(reminder_claim=token).update(
+                reminder_claim='', reminder_sent_at=timezone.now(),
+            )
+
+        if len(failed) == claimed:
+            # nothing got through; let the next run retry rather than spin
+            return sent
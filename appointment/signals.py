@@ -0,0 +1,119 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from beauty_salon_project import trending
+
+from . import calendar_cache
+from .analytics import mark_dirty
+from .availability import appointment_interval, occupy, refresh_stored
+from .models import Appointment, Holiday, Service, TimeSlot
+
+INTERVAL_FIELDS = ('staff_id', 'status', 'starts_at', 'ends_at')
+# what the save/delete handlers here and in user.signals compare against
+STORED_FIELDS = (*INTERVAL_FIELDS, 'customer_id')
+
+# trending weights per event
+VIEW_WEIGHT = 1
+BOOKING_WEIGHT = 5
+
+trending.register(Service, 'view_count', VIEW_WEIGHT)
+trending.register(Service, 'booking_count', BOOKING_WEIGHT)
+
+
+def held_interval(values):
+    # (staff_id, day, start_minute, end_minute) the appointment blocks, or None
+    if values is None or values['status'] in Appointment.INACTIVE_STATUSES or not values['starts_at']:
+        return None
+    day, start, end = appointment_interval(values['starts_at'], values['ends_at'])
+    return values['staff_id'], day, start, end
+
+
+def loaded_values(instance):
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None or any(field not in loaded for field in INTERVAL_FIELDS):
+        return None
+    return {field: loaded[field] for field in INTERVAL_FIELDS}
+
+
+def current_values(instance):
+    return {field: getattr(instance, field) for field in INTERVAL_FIELDS}
+
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_delete, sender=Appointment)
+def remember_stored_interval(sender, instance, raw=False, **kwargs):
+    # a deferred load leaves _loaded_values incomplete; read what the row
+    # holds now so a reschedule still refreshes the day it leaves
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if raw or instance._state.adding or all(field in loaded for field in STORED_FIELDS):
+        return
+    stored = Appointment.objects.filter(pk=instance.pk).values(*STORED_FIELDS).first()
+    if stored:
+        instance._loaded_values = {**loaded, **stored}
+
+
+@receiver(post_save, sender=Appointment)
+def patch_availability_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else held_interval(loaded_values(instance))
+    current = held_interval(current_values(instance))
+    if previous == current:
+        return
+    if previous:
+        refresh_stored(staff_id=previous[0], date=previous[1])
+    if current and (not previous or previous[:2] != current[:2]):
+        occupy(*current)
+
+
+@receiver(post_delete, sender=Appointment)
+def patch_availability_on_delete(sender, instance, **kwargs):
+    interval = held_interval(loaded_values(instance) or current_values(instance))
+    if interval:
+        refresh_stored(staff_id=interval[0], date=interval[1])
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def mark_revenue_days_dirty(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    moments = {loaded.get('starts_at')}
+    if 'starts_at' not in instance.get_deferred_fields():
+        moments.add(instance.starts_at)
+    moments -= {None}
+    if moments:
+        mark_dirty(timezone.localdate(moment) for moment in moments)
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def refresh_availability_on_template_change(sender, instance, raw=False, **kwargs):
+    calendar_cache.invalidate()
+    if not raw:
+        refresh_stored(staff_id=instance.staff_id, date__gte=timezone.localdate())
+
+
+@receiver(pre_save, sender=Holiday)
+def remember_holiday_date(sender, instance, raw=False, **kwargs):
+    instance._previous_date = None
+    if instance.pk and not raw:
+        instance._previous_date = Holiday.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+def refresh_availability_on_holiday_change(sender, instance, raw=False, **kwargs):
+    calendar_cache.invalidate()
+    if raw:
+        return
+    dates = {instance.date, getattr(instance, '_previous_date', None)} - {None}
+    refresh_stored(date__in=dates)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_trending_services(sender, instance, raw=False, **kwargs):
+    trending.invalidate(Service)
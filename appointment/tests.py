@@ -1,3 +1,677 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time as time_module
+from importlib import import_module
+from unittest import mock
+from datetime import datetime, time, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from beauty_salon_project import counters
+from beauty_salon_project.testing import ChangelistQueryBudgetMixin, bulk_users
+from beauty_salon_project.versions import SharedVersion
+from user.models import StaffProfile, User
+from . import analytics, calendar_cache
+from .availability import (
+    decode_bitmap, first_openings, fitting_starts, get_available_slots, iter_bits, rebuild_availability, span,
+)
+from .booking import BookingConflict, book_appointment, bulk_book
+from .recurring import create_series
+from .reminders import LocmemReminderBackend, claim_reminders, dispatch_reminders, due_reminders
+from .models import (
+    Appointment, Holiday, RecurringSeries, RevenueDirtyDay, RevenueSummary, Service, ServiceCategory,
+    StaffDayAvailability, TimeSlot,
+)
+
+
+def make_user(username, role='customer'):
+    return User.objects.create(
+        username=username, email=f'{username}@example.com',
+        phone=f'09{abs(hash(username)) % 10 ** 9:09d}', postcode=username, role=role,
+    )
+
+
+def next_weekday(weekday):
+    day = timezone.localdate() + timedelta(days=1)
+    return day + timedelta(days=(weekday - day.weekday()) % 7)
+
+
+def at(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+class SalonFixture:
+    # one staff member working Mondays 9:00-12:00 and a one-hour service
+
+    def setUp(self):
+        category = ServiceCategory.objects.create(name='nails', slug='nails')
+        self.service = Service.objects.create(category=category, name='manicure', slug='manicure',
+                                              price=50, duration=60)
+        self.staff = make_user('stylist', role='staff')
+        self.customer = make_user('client')
+        self.day = next_weekday(0)
+        TimeSlot.objects.create(staff=self.staff, weekday=0, start_time=time(9), end_time=time(12),
+                                is_available=True)
+
+    def book(self, hour, minute=0, day=None, **fields):
+        day = day or self.day
+        return Appointment.objects.create(customer=self.customer, staff=self.staff, service=self.service,
+                                          appointment_date=at(day, hour, minute),
+                                          appointment_time=time(hour, minute), payment_method='cash', **fields)
+
+
+class SalonTestCase(SalonFixture, TestCase):
+    pass
+
+
+class AppointmentSpanTests(SalonTestCase):
+
+    def test_save_denormalizes_the_span(self):
+        appointment = self.book(10)
+        self.assertEqual((appointment.starts_at, appointment.ends_at), (at(self.day, 10), at(self.day, 11)))
+
+        appointment.appointment_time, appointment.end_time = time(23, 30), time(0, 30)
+        appointment.save(update_fields=['appointment_time', 'end_time'])
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.ends_at, at(self.day + timedelta(days=1), 0, 30))
+
+    def test_backfill_migration_fills_missing_spans(self):
+        appointments = [self.book(9), self.book(22, 30, end_time=time(1))]
+        Appointment.objects.update(starts_at=None, ends_at=None)
+        migration = import_module('appointment.migrations.0013_backfill_appointment_starts_at')
+        migration.backfill_starts_at(apps, None)
+
+        self.assertEqual(
+            list(Appointment.objects.order_by('pk').values_list('starts_at', 'ends_at')),
+            [(appointment.starts_at, appointment.ends_at) for appointment in appointments],
+        )
+
+    def test_overlap_and_day_queries(self):
+        appointment = self.book(10)
+        self.book(10, day=self.day + timedelta(days=1))
+        overlapping = Appointment.objects.filter(staff=self.staff).overlapping
+
+        self.assertEqual(list(overlapping(at(self.day, 10, 30), at(self.day, 11, 30))), [appointment])
+        self.assertFalse(overlapping(at(self.day, 11), at(self.day, 12)).exists())
+        self.assertFalse(overlapping(at(self.day, 9), at(self.day, 10)).exists())
+        self.assertEqual(list(Appointment.objects.on_days(self.day, self.day)), [appointment])
+        self.assertEqual(Appointment.objects.on_days(self.day, self.day + timedelta(days=1)).count(), 2)
+
+
+class CalendarCacheTests(TestCase):
+
+    def test_version_bump_from_another_worker_reloads(self):
+        loads = []
+
+        def load():
+            loads.append(1)
+            return [timezone.localdate()]
+
+        calendar_cache.holidays(load)
+        calendar_cache.holidays(load)
+        self.assertEqual(len(loads), 1)
+        # what invalidate() in another process writes to the shared cache
+        cache.set(calendar_cache.VERSION_KEY, 'bumped elsewhere', None)
+        calendar_cache.holidays(load)
+        self.assertEqual(len(loads), 2)
+
+
+class SharedVersionTests(TransactionTestCase):
+
+    def setUp(self):
+        self.version = SharedVersion('tests:shared-version')
+        self.addCleanup(cache.delete, self.version.key)
+
+    def reads(self, times):
+        with CaptureQueriesContext(connection) as queries:
+            versions = {self.version.get() for _ in range(times)}
+        return versions, len(queries)
+
+    def test_rechecks_at_most_every_interval(self):
+        first = self.version.get()
+        with override_settings(VERSION_CHECK_SECONDS=60):
+            self.version.get()
+            cache.set(self.version.key, 'bumped elsewhere', None)
+            self.assertEqual(self.reads(3), ({first}, 0))
+        with override_settings(VERSION_CHECK_SECONDS=0):
+            self.assertEqual(self.reads(1), ({'bumped elsewhere'}, 1))
+
+    @override_settings(VERSION_CHECK_SECONDS=0)
+    def test_reads_once_per_request(self):
+        request_started.send(sender=self.__class__)
+        self.addCleanup(request_finished.send, sender=self.__class__)
+        self.assertEqual(len(self.reads(3)[0]), 1)
+        self.assertEqual(self.reads(3)[1], 0)
+
+
+class WarmAvailabilityTests(SalonFixture, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # leave no process-local calendar behind for the next test
+        self.addCleanup(calendar_cache.invalidate)
+
+    def test_warm_computation_skips_calendar_queries(self):
+        cold = get_available_slots(self.staff, self.service, self.day, self.day)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_available_slots(self.staff, self.service, self.day, self.day), cold)
+        calendar = [query['sql'] for query in queries
+                    if any(table in query['sql'] for table in ('django_cache', 'appointment_holiday', 'appointment_timeslot'))]
+        self.assertEqual(calendar, [])
+
+
+class AvailabilityTests(SalonTestCase):
+
+    def slots(self):
+        return [timezone.localtime(start).time()
+                for start in get_available_slots(self.staff, self.service, self.day, self.day)]
+
+    def test_fitting_starts(self):
+        bitmap = span(10, 20) | span(30, 33)
+        self.assertEqual(list(iter_bits(fitting_starts(bitmap, 4))), list(range(10, 17)))
+        self.assertEqual(list(iter_bits(fitting_starts(bitmap, 3))), [*range(10, 18), 30])
+        self.assertEqual(fitting_starts(bitmap, 11), 0)
+
+    def test_free_day_offers_every_fitting_start(self):
+        self.assertEqual(self.slots(), [time(9), time(9, 15), time(9, 30), time(9, 45),
+                                        time(10), time(10, 15), time(10, 30), time(10, 45), time(11)])
+
+    def test_appointments_block_overlapping_starts(self):
+        self.book(10)
+        self.assertEqual(self.slots(), [time(9), time(11)])
+
+    def test_cancelled_appointments_free_their_time(self):
+        self.book(10, status='cancelled')
+        self.assertEqual(len(self.slots()), 9)
+
+    def test_holidays_have_no_slots(self):
+        Holiday.objects.create(name='closed', date=self.day)
+        self.assertEqual(self.slots(), [])
+
+    def test_materialized_rows_match_computed_bitmaps(self):
+        self.book(10, 30)
+        computed = self.slots()
+        rebuild_availability([self.staff.pk], self.day, self.day)
+
+        self.assertEqual(StaffDayAvailability.objects.count(), 1)
+        self.assertEqual(self.slots(), computed)
+        self.book(9)
+        self.assertEqual(self.slots(), [])
+
+
+class MaterializedAvailabilityTests(SalonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.next_day = self.day + timedelta(days=7)
+        rebuild_availability([self.staff.pk], self.day, self.next_day)
+
+    def free(self, day):
+        return decode_bitmap(StaffDayAvailability.objects.get(staff=self.staff, date=day).free_minutes)
+
+    def test_booking_and_cancelling_patch_the_day(self):
+        appointment = self.book(10)
+        self.assertEqual(self.free(self.day), span(9 * 60, 10 * 60) | span(11 * 60, 12 * 60))
+        appointment.status = 'cancelled'
+        appointment.save()
+        self.assertEqual(self.free(self.day), span(9 * 60, 12 * 60))
+
+    def test_reschedule_of_deferred_instance_refreshes_both_days(self):
+        self.book(10)
+        appointment = Appointment.objects.defer('staff', 'status', 'starts_at').get()
+        appointment.appointment_date = at(self.next_day, 10)
+        appointment.save()
+
+        self.assertEqual(self.free(self.day), span(9 * 60, 12 * 60))
+        self.assertEqual(self.free(self.next_day), span(9 * 60, 10 * 60) | span(11 * 60, 12 * 60))
+
+    def test_delete_of_deferred_instance_frees_the_day(self):
+        self.book(10)
+        Appointment.objects.defer('staff', 'starts_at', 'ends_at').get().delete()
+        self.assertEqual(self.free(self.day), span(9 * 60, 12 * 60))
+
+
+class FirstOpeningsTests(SalonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.early = make_user('early', role='staff')
+        self.idle = make_user('idle', role='staff')
+        TimeSlot.objects.create(staff=self.early, weekday=0, start_time=time(8), end_time=time(10),
+                                is_available=True)
+        TimeSlot.objects.create(staff=self.idle, weekday=0, start_time=time(6), end_time=time(12),
+                                is_available=True)
+        for staff, active in ((self.staff, True), (self.early, True), (self.idle, False)):
+            StaffProfile.objects.create(user=staff, is_active=active).specialties.add(self.service)
+
+    def openings(self, count):
+        return [(timezone.localtime(start).time(), staff.username)
+                for start, staff in first_openings(self.service, count, after=at(self.day, 0))]
+
+    def test_merges_staff_calendars_in_time_order(self):
+        self.assertEqual(self.openings(5), [
+            (time(8), 'early'), (time(8, 15), 'early'), (time(8, 30), 'early'),
+            (time(8, 45), 'early'), (time(9), 'stylist'),
+        ])
+        # ties go to the lower staff pk
+        self.assertEqual(self.openings(7)[5:], [(time(9), 'early'), (time(9, 15), 'stylist')])
+
+    def test_booked_time_is_skipped(self):
+        Appointment.objects.create(customer=self.customer, staff=self.early, service=self.service,
+                                   appointment_date=at(self.day, 8, 30), appointment_time=time(8, 30),
+                                   payment_method='cash')
+        self.assertEqual(self.openings(2), [(time(9), 'stylist'), (time(9, 15), 'stylist')])
+
+    def test_no_specialists(self):
+        StaffProfile.objects.update(is_active=False)
+        self.assertEqual(first_openings(self.service, 3), [])
+
+
+class BulkImportTests(SalonTestCase):
+
+    def row(self, hour, minute=0, day=None, **fields):
+        return {'customer_id': self.customer.pk, 'staff_id': self.staff.pk, 'service_id': self.service.pk,
+                'appointment_date': at(day or self.day, hour, minute), 'appointment_time': time(hour, minute),
+                'payment_method': 'cash', **fields}
+
+    def write_csv(self, hours):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        self.addCleanup(os.unlink, handle.name)
+        with handle:
+            handle.write('customer,staff,service,appointment_date,appointment_time\n')
+            for hour in hours:
+                start = at(self.day, hour)
+                handle.write(f'{self.customer.pk},{self.staff.pk},{self.service.pk},{start.isoformat()},{hour}:00\n')
+        return handle.name
+
+    def test_bulk_book_rejects_overlaps(self):
+        self.book(9)
+        result = bulk_book([self.row(9, 30), self.row(10), self.row(10, 30), self.row(11, status='cancelled')])
+
+        self.assertEqual(result, (2, [0, 2]))
+        appointment = Appointment.objects.get(appointment_time=time(10))
+        self.assertEqual((appointment.starts_at, appointment.ends_at), (at(self.day, 10), at(self.day, 11)))
+        self.assertEqual(appointment.end_time, time(11))
+        self.assertEqual(appointment.total_price, 50)
+
+    def test_strict_bulk_book_inserts_nothing(self):
+        with self.assertRaises(BookingConflict):
+            bulk_book([self.row(9), self.row(9, 30)], strict=True)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_unknown_service(self):
+        with self.assertRaises(Service.DoesNotExist):
+            bulk_book([self.row(9, service_id=self.service.pk + 100)])
+
+    def test_import_commits_chunks_and_reports_lines(self):
+        out = StringIO()
+        call_command('import_appointments', self.write_csv([9, 10, 11, 10, 9]), chunk_size=2, stdout=out)
+
+        self.assertEqual(Appointment.objects.count(), 3)
+        self.assertIn('Imported 3 appointments', out.getvalue())
+        self.assertIn('(lines 5, 6)', out.getvalue())
+
+    def test_unparseable_dates_name_the_line(self):
+        path = self.write_csv([9])
+        with open(path, 'a') as handle:
+            handle.write(f'{self.customer.pk},{self.staff.pk},{self.service.pk},tomorrow,10:00\n')
+        with self.assertRaisesMessage(CommandError, "line 3: bad appointment_date 'tomorrow'"):
+            call_command('import_appointments', path, stdout=StringIO())
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_strict_import_keeps_earlier_chunks(self):
+        with self.assertRaisesMessage(CommandError, 'lines 4-5'):
+            call_command('import_appointments', self.write_csv([9, 10, 11, 9]), chunk_size=2,
+                         strict=True, stdout=StringIO())
+        self.assertEqual(Appointment.objects.count(), 2)
+
+
+class ServiceDetailTests(SalonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(counters.flush)
+
+    def test_views_are_counted_and_trend(self):
+        url = reverse('appointment:service_detail', args=['manicure'])
+        response = self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(response.json()['final_price'], '50')
+        counters.flush()
+
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.view_count, 2)
+        self.assertGreater(self.service.trend_score, 0)
+
+    def test_inactive_services_are_not_found(self):
+        Service.objects.filter(pk=self.service.pk).update(is_active=False)
+        response = self.client.get(reverse('appointment:service_detail', args=['manicure']))
+        self.assertEqual(response.status_code, 404)
+
+
+class StaffCalendarTests(SalonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+        self.url = reverse('appointment:staff_calendar', args=[self.staff.pk])
+        self.query = {'date': self.day.isoformat(), 'view': 'week'}
+        self.appointments = [self.book(9), self.book(11)]
+
+    def get(self, **headers):
+        return self.client.get(self.url, self.query, headers=headers)
+
+    def test_full_response(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['appointments']],
+                         [appointment.pk for appointment in self.appointments])
+        self.assertTrue(response['ETag'])
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_unchanged_calendar_is_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+    def test_delete_changes_the_etag(self):
+        first = self.get()
+        self.appointments[0].delete()
+        response = self.get(if_none_match=first['ETag'], if_modified_since=http_date(time_module.time() + 60))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['appointments']), 1)
+
+    def test_if_modified_since_alone_never_revalidates(self):
+        self.assertEqual(self.get(if_modified_since=http_date(time_module.time() + 60)).status_code, 200)
+
+    def test_other_staff_are_forbidden(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.get().status_code, 403)
+
+
+class RecurringSeriesTests(SalonTestCase):
+
+    def create(self, occurrences=3, **kwargs):
+        return create_series(self.customer, self.staff, self.service, self.day, time(10), occurrences, **kwargs)
+
+    def starts(self, result):
+        return [timezone.localtime(appointment.starts_at) for appointment in result.appointments]
+
+    def test_books_every_occurrence(self):
+        result = self.create(frequency='biweekly')
+
+        self.assertEqual(self.starts(result), [at(self.day + timedelta(weeks=week), 10) for week in (0, 2, 4)])
+        self.assertEqual(result.series.appointments.count(), 3)
+        self.assertEqual(result.skipped, [])
+
+    def test_conflicts_and_holidays_are_skipped(self):
+        self.book(10, 30, day=self.day + timedelta(weeks=1))
+        Holiday.objects.create(name='closed', date=self.day + timedelta(weeks=2))
+        result = self.create()
+
+        self.assertEqual(self.starts(result), [at(self.day, 10)])
+        self.assertEqual(result.skipped, [self.day + timedelta(weeks=1), self.day + timedelta(weeks=2)])
+
+    def test_conflicts_shift_to_the_next_free_start(self):
+        self.book(10, day=self.day + timedelta(weeks=1))
+        result = self.create(on_conflict='shift')
+
+        self.assertEqual(self.starts(result), [at(self.day, 10), at(self.day + timedelta(weeks=1), 11),
+                                               at(self.day + timedelta(weeks=2), 10)])
+
+    def test_full_day_is_skipped_even_when_shifting(self):
+        self.book(11, day=self.day + timedelta(weeks=1))
+        self.book(9, 30, day=self.day + timedelta(weeks=1))
+        result = self.create(on_conflict='shift')
+        self.assertEqual(result.skipped, [self.day + timedelta(weeks=1)])
+
+    def test_nothing_bookable_saves_nothing(self):
+        Holiday.objects.create(name='closed', date=self.day)
+        result = self.create(occurrences=1)
+
+        self.assertEqual(result, (None, [], [self.day]))
+        self.assertFalse(RecurringSeries.objects.exists())
+
+    def test_needs_an_occurrence(self):
+        with self.assertRaises(ValueError):
+            self.create(occurrences=0)
+
+
+class ReminderTests(SalonTestCase):
+    WINDOW = timedelta(days=8)
+
+    def setUp(self):
+        super().setUp()
+        LocmemReminderBackend.outbox = []
+        self.appointments = [self.book(9), self.book(11)]
+
+    def dispatch(self):
+        return dispatch_reminders(self.WINDOW, backend=LocmemReminderBackend())
+
+    def test_due_reminders_read_the_partial_indexes(self):
+        plan = due_reminders(self.WINDOW)[:200].explain()
+        self.assertIn('USING INDEX appointment_reminder_due_idx', plan)
+        self.assertIn('USING INDEX appointment_reminder_lease_idx', plan)
+        self.assertNotIn('SCAN appointment_appointment', plan)
+
+    def test_claim_send_and_confirm(self):
+        self.assertEqual(self.dispatch(), 2)
+        self.assertEqual(sorted(pk for pk, _ in LocmemReminderBackend.outbox),
+                         [appointment.pk for appointment in self.appointments])
+        for appointment in Appointment.objects.all():
+            self.assertTrue(appointment.reminder_sent)
+            self.assertEqual(appointment.reminder_claim, '')
+            self.assertIsNotNone(appointment.reminder_sent_at)
+        self.assertEqual(self.dispatch(), 0)
+
+    def test_claims_do_not_overlap(self):
+        first, first_count = claim_reminders(self.WINDOW, 1)
+        second, second_count = claim_reminders(self.WINDOW, 10)
+
+        self.assertEqual((first_count, second_count), (1, 1))
+        self.assertEqual(claim_reminders(self.WINDOW, 10)[1], 0)
+        self.assertEqual(Appointment.objects.filter(reminder_claim__in=[first, second]).count(), 2)
+        self.assertEqual(self.dispatch(), 0)
+
+    def test_expired_claim_is_taken_over(self):
+        # a worker claimed both and died before sending
+        claim_reminders(self.WINDOW, 10, now=timezone.now() - timedelta(minutes=20))
+        self.assertEqual(self.dispatch(), 2)
+        self.assertFalse(Appointment.objects.exclude(reminder_claim='').exists())
+
+    def test_failed_sends_are_released(self):
+        class Failing(LocmemReminderBackend):
+            def send(self, appointment):
+                raise OSError('smtp down')
+
+        with self.assertLogs('appointment.reminders', 'ERROR'):
+            self.assertEqual(dispatch_reminders(self.WINDOW, backend=Failing()), 0)
+        self.assertFalse(Appointment.objects.filter(reminder_sent=True).exists())
+        self.assertEqual(self.dispatch(), 2)
+
+
+class RevenueSummaryTests(SalonTestCase):
+
+    def test_report_rebuilds_dirty_days(self):
+        self.book(9, is_paid=True)
+        self.book(10, status='cancelled')
+        next_week = self.day + timedelta(days=7)
+        self.book(11, day=next_week)
+        self.assertEqual(set(RevenueDirtyDay.objects.values_list('date', flat=True)), {self.day, next_week})
+
+        report = analytics.revenue_report(self.day, next_week, by='day')
+        self.assertEqual(
+            [(row['date'], row['appointments'], row['paid_revenue']) for row in report],
+            [(self.day, 1, 50), (next_week, 1, 0)],
+        )
+        self.assertFalse(RevenueDirtyDay.objects.exists())
+
+    def test_rebuild_skips_days_between_ranges(self):
+        middle = self.day + timedelta(days=7)
+        for day in (self.day, middle, self.day + timedelta(days=14)):
+            self.book(9, day=day)
+        RevenueSummary.objects.all().delete()
+
+        analytics.rebuild_days([self.day, self.day + timedelta(days=14)])
+        self.assertEqual(RevenueSummary.objects.count(), 2)
+        self.assertFalse(RevenueSummary.objects.filter(date=middle).exists())
+
+    def test_day_marked_again_during_refresh_stays_dirty(self):
+        self.book(9)
+        rebuild_days = analytics.rebuild_days
+
+        def marked_meanwhile(days):
+            rebuild_days(days)
+            RevenueDirtyDay.objects.update(marked_at=F('marked_at') + timedelta(seconds=1))
+
+        with mock.patch.object(analytics, 'rebuild_days', marked_meanwhile):
+            self.assertEqual(analytics.refresh_dirty(), 1)
+        self.assertTrue(RevenueDirtyDay.objects.filter(date=self.day).exists())
+
+        self.assertEqual(analytics.refresh_dirty(), 1)
+        self.assertFalse(RevenueDirtyDay.objects.exists())
+
+
+class ConcurrentReminderTests(SalonFixture, TransactionTestCase):
+
+    def test_parallel_workers_send_each_reminder_once(self):
+        LocmemReminderBackend.outbox = []
+        for week in range(10):
+            for hour in (9, 11):
+                self.book(hour, day=self.day + timedelta(weeks=week))
+        barrier = threading.Barrier(6)
+
+        def worker():
+            barrier.wait()
+            try:
+                dispatch_reminders(timedelta(weeks=11), chunk_size=3, backend=LocmemReminderBackend())
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sent = sorted(pk for pk, _ in LocmemReminderBackend.outbox)
+        self.assertEqual(sent, sorted(Appointment.objects.values_list('pk', flat=True)))
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+
+    def setUp(self):
+        category = ServiceCategory.objects.create(name='hair', slug='hair')
+        self.service = Service.objects.create(category=category, name='haircut', slug='haircut',
+                                              price=100, duration=60)
+        self.staff = [make_user(f'staff{i}', role='staff') for i in range(2)]
+        self.customers = [make_user(f'customer{i}') for i in range(12)]
+        self.start = timezone.make_aware(datetime.combine(
+            timezone.localdate() + timedelta(days=1), time(10)))
+
+    def tearDown(self):
+        counters.flush()
+
+    def run_concurrently(self, jobs):
+        barrier = threading.Barrier(len(jobs))
+        results = []
+
+        def worker(staff, customer, start):
+            barrier.wait()
+            try:
+                book_appointment(customer, staff, self.service, start, payment_method='cash')
+                results.append('booked')
+            except BookingConflict:
+                results.append('conflict')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=job) for job in jobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_simultaneous_bookings_for_same_slot(self):
+        offsets = [0, 15, 30, 45] * 3
+        jobs = [(self.staff[0], customer, self.start + timedelta(minutes=offset))
+                for customer, offset in zip(self.customers, offsets)]
+        results = self.run_concurrently(jobs)
+
+        self.assertEqual(results.count('booked'), 1)
+        self.assertEqual(results.count('conflict'), len(jobs) - 1)
+        self.assertEqual(Appointment.objects.filter(staff=self.staff[0]).count(), 1)
+        counters.flush()
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.booking_count, 1)
+
+    def test_different_staff_do_not_conflict(self):
+        jobs = [(staff, customer, self.start) for staff, customer in zip(self.staff, self.customers)]
+        results = self.run_concurrently(jobs)
+
+        self.assertEqual(results, ['booked', 'booked'])
+
+    def test_back_to_back_bookings_are_allowed(self):
+        book_appointment(self.customers[0], self.staff[0], self.service, self.start)
+        book_appointment(self.customers[1], self.staff[0], self.service,
+                         self.start + timedelta(minutes=60))
+        with self.assertRaises(BookingConflict):
+            book_appointment(self.customers[2], self.staff[0], self.service,
+                             self.start + timedelta(minutes=30))
+
+
+class AdminQueryBudgetTests(ChangelistQueryBudgetMixin, TestCase):
+    ROWS = 1200
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = ServiceCategory.objects.bulk_create([
+            ServiceCategory(name=f'category{i}', slug=f'category{i}') for i in range(cls.ROWS)
+        ])
+        services = Service.objects.bulk_create([
+            Service(category=categories[i % 10], name=f'service{i}', slug=f'service{i}', price=100, duration=30)
+            for i in range(cls.ROWS)
+        ])
+        staff = bulk_users('staff', 20, role='staff')
+        customers = bulk_users('customer', 50)
+        day = timezone.localdate()
+        Appointment.objects.bulk_create([
+            Appointment(customer=customers[i % 50], staff=staff[i % 20], service=services[i],
+                        appointment_date=timezone.now(), appointment_time=time(10), total_price=100)
+            for i in range(cls.ROWS)
+        ])
+        TimeSlot.objects.bulk_create([
+            TimeSlot(staff=staff[i % 20], weekday=i // 20 % 7, start_time=time(i // 140 % 24), end_time=None)
+            for i in range(cls.ROWS)
+        ])
+        Holiday.objects.bulk_create([
+            Holiday(name=f'holiday{i}', date=day + timedelta(days=i)) for i in range(cls.ROWS)
+        ])
+
+    def test_service_category_changelist(self):
+        self.assertChangelistQueries(ServiceCategory, 5)
+
+    def test_service_changelist(self):
+        self.assertChangelistQueries(Service, 5)
+
+    def test_appointment_changelist(self):
+        self.assertChangelistQueries(Appointment, 8)
+
+    def test_time_slot_changelist(self):
+        self.assertChangelistQueries(TimeSlot, 5)
+
+    def test_holiday_changelist(self):
+        self.assertChangelistQueries(Holiday, 7)
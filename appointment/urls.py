@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'appointment'
+
+urlpatterns = [
+    path('staff/<int:staff_id>/calendar/', views.staff_calendar, name='staff_calendar'),
+    path('services/<slug:slug>/', views.service_detail, name='service_detail'),
+]
@@ -1,3 +1,101 @@
-from django.shortcuts import render
+import hashlib
+from datetime import timedelta
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+
+from beauty_salon_project import counters
+
+from .models import Appointment, Service
+
+CALENDAR_CACHE_TIMEOUT = 300
+
+
+def calendar_window(day, view):
+    if view == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    return day, day
+
+
+def calendar_payload(appointments, staff_id, start, end):
+    return {
+        'staff': staff_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'appointments': [
+            {
+                'id': appointment.pk,
+                'starts_at': timezone.localtime(appointment.starts_at).isoformat(),
+                'ends_at': timezone.localtime(appointment.ends_at).isoformat(),
+                'service': appointment.service.name,
+                'customer': appointment.customer.get_full_name(),
+                'status': appointment.status,
+            }
+            for appointment in appointments
+        ],
+    }
+
+
+@require_GET
+@login_required
+def staff_calendar(request, staff_id):
+    if request.user.pk != staff_id and not (request.user.is_staff or request.user.is_admin):
+        return HttpResponseForbidden()
+
+    day = parse_date(request.GET.get('date', '')) if request.GET.get('date') else timezone.localdate()
+    view = request.GET.get('view', 'day')
+    if day is None or view not in ('day', 'week'):
+        return HttpResponseBadRequest('expected ?date=YYYY-MM-DD&view=day|week')
+    start, end = calendar_window(day, view)
+
+    appointments = Appointment.objects.filter(staff_id=staff_id).on_days(start, end)
+    # the latest update plus the row count changes on every edit, insert and
+    # delete. No Last-Modified: max(updated_at) does not move on a delete, so
+    # If-Modified-Since alone would revalidate a stale calendar.
+    state = appointments.order_by().aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    last_modified = state['last_modified']
+    fingerprint = f"{staff_id}:{start}:{end}:{last_modified and last_modified.timestamp()}:{state['count']}"
+    etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        payload = cache.get_or_set(
+            f'staff-calendar:{etag}',
+            lambda: calendar_payload(
+                appointments.select_related('customer', 'service').order_by('starts_at'),
+                staff_id, start, end,
+            ),
+            CALENDAR_CACHE_TIMEOUT,
+        )
+        response = JsonResponse(payload)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@require_GET
+def service_detail(request, slug):
+    service = get_object_or_404(Service.objects.select_related('category'), slug=slug, is_active=True)
+    # write-behind; the flush also turns the view into a trending score increment
+    counters.increment(Service, service.pk, 'view_count')
+    return JsonResponse({
+        'id': service.pk,
+        'name': service.name,
+        'slug': service.slug,
+        'category': service.category.name,
+        'description': service.description,
+        'price': str(service.price),
+        'final_price': str(service.get_final_price()),
+        'duration': service.duration,
+        'rating': str(service.rating) if service.rating is not None else None,
+    })
@@ -0,0 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from appointment.models import Service
+from products.category_tree import get_tree
+from products.models import Product
+
+from . import trending
+
+
+def trending_items(request):
+    # lazy, so pages that do not render the trending widget skip the lookup
+    return {
+        'trending_products': SimpleLazyObject(lambda: trending.top(Product)),
+        'trending_services': SimpleLazyObject(lambda: trending.top(Service)),
+    }
+
+
+def category_menu(request):
+    return {'category_menu': SimpleLazyObject(lambda: get_tree().menu())}
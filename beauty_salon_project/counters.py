@@ -0,0 +1,155 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+# Write-behind counters for hot integer columns such as Service.view_count or
+# Product.view_count. Increments are summed in process memory and written
+# as one ``col = col + n`` UPDATE per group of rows with identical deltas, so
+# concurrent processes never lose updates and hot rows see one write per
+# flush instead of one per hit. Pending increments are at most
+# COUNTER_FLUSH_INTERVAL seconds old, and are flushed at interpreter exit.
+# Listeners see every batch before it is written and may add derived
+# increments (e.g. trending scores) that go out in the same flush.
+#
+# An overdue incr() flushes only once the caller's transaction commits, so a
+# rollback cannot take drained increments with it. A flush from another
+# connection may not see rows whose insert has not committed yet; their
+# increments go back into the buffer, for at most MAX_MISSES flushes.
+
+DEFAULT_FLUSH_INTERVAL = 5
+MAX_MISSES = 3
+
+
+class CounterBuffer:
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval
+        self._pending = defaultdict(int)
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._listeners = []
+        self._misses = defaultdict(int)
+
+    @property
+    def interval(self):
+        if self.flush_interval is not None:
+            return self.flush_interval
+        return getattr(settings, 'COUNTER_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+    def incr(self, model, pk, field, amount=1):
+        now = time.monotonic()
+        with self._lock:
+            self._pending[model, pk, field] += amount
+            if self._oldest is None:
+                self._oldest = now
+            overdue = now - self._oldest >= self.interval
+        self._ensure_thread()
+        if overdue:
+            transaction.on_commit(self.flush)
+
+    def add_listener(self, listener):
+        # listener(pending) -> {(model, pk, field): amount} of extra increments
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(int)
+                self._oldest = None
+            if not pending:
+                return 0
+            # derived increments are recomputed if this flush has to be retried
+            original = dict(pending)
+            for listener in self._listeners:
+                for key, amount in listener(original).items():
+                    pending[key] += amount
+
+            rows = defaultdict(dict)
+            for (model, pk, field), amount in pending.items():
+                if amount:
+                    rows[model, pk][field] = amount
+            groups = defaultdict(list)
+            for (model, pk), deltas in rows.items():
+                groups[model, tuple(sorted(deltas.items()))].append(pk)
+
+            missing = set()
+            try:
+                for (model, deltas), pks in groups.items():
+                    updated = model.objects.filter(pk__in=pks).update(
+                        **{field: Coalesce(F(field), 0, output_field=model._meta.get_field(field)) + amount
+                           for field, amount in deltas})
+                    if updated < len(pks):
+                        found = set(model.objects.filter(pk__in=pks).values_list('pk', flat=True))
+                        missing.update((model, pk) for pk in pks if pk not in found)
+            except Exception:
+                logger.exception('flushing counters failed; keeping them for the next flush')
+                with self._lock:
+                    for key, amount in original.items():
+                        self._pending[key] += amount
+                    if self._oldest is None:
+                        self._oldest = time.monotonic()
+                return 0
+            self._requeue(original, missing, rows)
+            return len(rows) - len(missing)
+
+    def _requeue(self, original, missing, rows):
+        if not missing and not self._misses:
+            return
+        with self._lock:
+            for key in rows:
+                if key in missing:
+                    self._misses[key] += 1
+                else:
+                    self._misses.pop(key, None)
+            dropped = {key for key in missing if self._misses[key] > MAX_MISSES}
+            for (model, pk, field), amount in original.items():
+                if (model, pk) in missing and (model, pk) not in dropped:
+                    self._pending[model, pk, field] += amount
+                    if self._oldest is None:
+                        self._oldest = time.monotonic()
+            for key in dropped:
+                del self._misses[key]
+        if dropped:
+            logger.warning('dropping counter increments for missing rows: %s',
+                           ', '.join(f'{model._meta.label}:{pk}' for model, pk in sorted(
+                               dropped, key=lambda key: (key[0]._meta.label, key[1]))))
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='counter-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+buffer = CounterBuffer()
+atexit.register(buffer.flush)
+
+
+def increment(model, pk, field, amount=1):
+    buffer.incr(model, pk, field, amount)
+
+
+def flush():
+    return buffer.flush()
@@ -0,0 +1,61 @@
+from django.db.models import Count, DecimalField, F, FloatField, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+# Ratings are kept as a running sum and count next to the stored average, so
+# adding, changing or removing one rating is a single UPDATE whose right-hand
+# side only reads the row being written. Concurrent reviews therefore cannot
+# overwrite each other the way read-average-save does.
+#
+# The running totals are always baseline + review rows. The baseline columns
+# hold what has no review row: the aggregates that predate review rows and
+# ratings applied with ``baseline=True`` (StaffProfile.update_rating).
+# recompute_ratings() rebuilds the totals from exactly those two sources.
+
+AVERAGE = DecimalField(max_digits=3, decimal_places=2)
+BASELINE_SUM = 'baseline_rating_sum'
+BASELINE_COUNT = 'baseline_rating_count'
+
+
+def average(total, count):
+    return Coalesce(Cast(Cast(total, FloatField()) / NullIf(count, 0), AVERAGE), 0)
+
+
+def apply_rating(model, pk, score, count=1, sum_field='rating_sum',
+                 count_field='rating_count', average_field='rating', baseline=False):
+    new_sum = Coalesce(F(sum_field), 0) + score
+    new_count = Coalesce(F(count_field), 0) + count
+    changes = {sum_field: new_sum, count_field: new_count, average_field: average(new_sum, new_count)}
+    if baseline:
+        changes[BASELINE_SUM] = F(BASELINE_SUM) + score
+        changes[BASELINE_COUNT] = F(BASELINE_COUNT) + count
+    return model.objects.filter(pk=pk).update(**changes)
+
+
+def move_rating(model, previous_pk, pk, previous_score, score, **fields):
+    # a review that changed target and/or score
+    if previous_pk != pk:
+        apply_rating(model, previous_pk, -previous_score, count=-1, **fields)
+        apply_rating(model, pk, score, **fields)
+    elif previous_score != score:
+        apply_rating(model, pk, score - previous_score, count=0, **fields)
+
+
+def recompute_ratings(model, reviews, target_field, sum_field='rating_sum',
+                      count_field='rating_count', average_field='rating', chunk_size=1000):
+    # Rebuilds every object's aggregates as baseline + its review rows, one
+    # UPDATE with grouped subqueries per ``chunk_size`` primary keys. Objects
+    # without reviews are reset to their baseline. Returns the rows written.
+    grouped = reviews.filter(**{target_field: OuterRef('pk')}).order_by().values(target_field)
+    new_sum = F(BASELINE_SUM) + Coalesce(Subquery(grouped.annotate(total=Sum('score')).values('total')), 0)
+    new_count = F(BASELINE_COUNT) + Coalesce(Subquery(grouped.annotate(total=Count('pk')).values('total')), 0)
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    fixed = 0
+    for low in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        fixed += model.objects.filter(pk__gte=low, pk__lt=low + chunk_size).update(**{
+            sum_field: new_sum,
+            count_field: new_count,
+            average_field: average(new_sum, new_count),
+        })
+    return fixed
@@ -64,6 +64,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'beauty_salon_project.context_processors.trending_items',
+                'beauty_salon_project.context_processors.category_menu',
             ],
         },
     },
@@ -79,9 +81,37 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        # a file-backed test database, so concurrent booking tests wait on
+        # SQLite's lock instead of failing on the shared in-memory cache
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# The calendar, category tree, trending and facet caches are per process
+# and compare version keys kept here, so this backend must be shared by
+# every worker; a per-process LocMemCache would hide invalidations from the
+# other workers. Create the table with ``python manage.py createcachetable``,
+# or point this at memcached/Redis.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
     }
 }
 
+# A worker rereads those version keys at most once per request and every
+# this many seconds otherwise; see beauty_salon_project.versions.
+VERSION_CHECK_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
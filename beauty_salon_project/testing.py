@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Shared by the apps' tests.py: renders admin changelists and checks that
+# the number of queries stays within a fixed budget however many rows exist.
+
+
+def bulk_users(prefix, count, **fields):
+    User = get_user_model()
+    return User.objects.bulk_create([
+        User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', phone=f'{prefix[:2]}{i:09d}',
+             postcode=f'{prefix}{i}', **fields)
+        for i in range(count)
+    ])
+
+
+class ChangelistQueryBudgetMixin:
+
+    def setUp(self):
+        super().setUp()
+        admin_user = get_user_model().objects.create(
+            username='budget-admin', email='budget-admin@example.com', phone='00000000000',
+            postcode='budget-admin', is_staff=True, is_superuser=True,
+        )
+        self.client.force_login(admin_user)
+
+    def assertChangelistQueries(self, model, budget, params=None):
+        url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.context['cl'].result_count, 1000)
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{url} ran {len(queries)} queries:\n' + '\n'.join(query['sql'] for query in queries),
+        )
+        return len(queries)
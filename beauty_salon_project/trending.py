@@ -0,0 +1,102 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import counters
+
+# Trending scores are exponentially decayed event counts kept in a
+# ``trend_score`` column. Instead of decaying every row as time passes, an
+# event at time t adds weight * 2 ** ((t - EPOCH) / half_life): older
+# contributions shrink by half per half-life relative to new ones, so
+# ordering by the raw column is ordering by the decayed score, and one
+# ``col = col + n`` UPDATE keeps it current. ``decayed()`` turns a stored
+# score back into today's value. With the default one-week half-life the
+# growth factor stays within float range for well over a decade.
+#
+# Counter increments (views, sales, bookings) are turned into score
+# increments when the counter buffer flushes; other events call ``bump()``.
+# The top K rows per category are cached under a per-model version key that
+# the model signal handlers bump, and expire after CACHE_TIMEOUT seconds so
+# the ranking follows new activity.
+
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+DEFAULT_HALF_LIFE_HOURS = 7 * 24
+DEFAULT_TOP_K = 10
+CACHE_TIMEOUT = 60
+
+_sources = {}
+
+
+def half_life_hours():
+    return getattr(settings, 'TRENDING_HALF_LIFE_HOURS', DEFAULT_HALF_LIFE_HOURS)
+
+
+def growth(moment=None):
+    hours = ((moment or timezone.now()) - EPOCH).total_seconds() / 3600
+    return 2.0 ** (hours / half_life_hours())
+
+
+def decayed(score, moment=None):
+    return (score or 0) / growth(moment)
+
+
+def register(model, field, weight):
+    # every increment of ``model.field`` adds ``weight`` to the trending score
+    _sources[model, field] = weight
+
+
+def derive_scores(pending):
+    factor = growth()
+    scores = defaultdict(float)
+    for (model, pk, field), amount in pending.items():
+        weight = _sources.get((model, field))
+        if weight and amount > 0:
+            scores[model, pk, 'trend_score'] += weight * amount * factor
+    return scores
+
+
+counters.buffer.add_listener(derive_scores)
+
+
+def bump(model, pk, weight, moment=None):
+    counters.increment(model, pk, 'trend_score', weight * growth(moment))
+
+
+def version_key(model):
+    return f'trending:{model._meta.label_lower}:version'
+
+
+def current_version(model):
+    version = cache.get(version_key(model))
+    if version is None:
+        cache.add(version_key(model), uuid.uuid4().hex, None)
+        version = cache.get(version_key(model))
+    return version
+
+
+def invalidate(model):
+    cache.set(version_key(model), uuid.uuid4().hex, None)
+
+
+def top_ids(model, category_id=None, k=DEFAULT_TOP_K):
+    key = f'trending:{model._meta.label_lower}:{category_id or "all"}:{k}:{current_version(model)}'
+    ids = cache.get(key)
+    if ids is None:
+        rows = model.objects.filter(is_active=True, trend_score__gt=0)
+        if category_id:
+            rows = rows.filter(category_id=category_id)
+        ids = list(rows.order_by('-trend_score').values_list('pk', flat=True)[:k])
+        cache.set(key, ids, CACHE_TIMEOUT)
+    return ids
+
+
+def top(model, category_id=None, k=DEFAULT_TOP_K, queryset=None):
+    ids = top_ids(model, category_id, k)
+    if not ids:
+        return []
+    rows = (queryset if queryset is not None else model.objects).in_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
@@ -0,0 +1,77 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+# Version keys in the shared cache that tell a process when to drop its
+# local copy of something (the calendar, the category tree). On the
+# database cache every read is a query, so a process reads a key at most
+# once per request and otherwise at most every VERSION_CHECK_SECONDS;
+# another worker's bump is seen within that interval. A version read inside
+# a transaction may be that transaction's own bump, which a rollback undoes,
+# so it is only reused for the rest of the request.
+
+DEFAULT_CHECK_SECONDS = 5
+
+_local = threading.local()
+
+
+def check_seconds():
+    return getattr(settings, 'VERSION_CHECK_SECONDS', DEFAULT_CHECK_SECONDS)
+
+
+def _request_versions():
+    return getattr(_local, 'versions', None)
+
+
+def _start_request(**kwargs):
+    _local.versions = {}
+
+
+def _finish_request(**kwargs):
+    _local.versions = None
+
+
+request_started.connect(_start_request)
+request_finished.connect(_finish_request)
+
+
+class SharedVersion:
+
+    def __init__(self, key):
+        self.key = key
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = None
+
+    def get(self):
+        scoped = _request_versions()
+        if scoped is not None and self.key in scoped:
+            return scoped[self.key]
+        with self._lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < check_seconds():
+                return self._version
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, uuid.uuid4().hex, None)
+            version = cache.get(self.key)
+        self._remember(version)
+        return version
+
+    def bump(self):
+        version = uuid.uuid4().hex
+        cache.set(self.key, version, None)
+        self._remember(version)
+        return version
+
+    def _remember(self, version):
+        with self._lock:
+            self._version = version
+            self._checked_at = None if connection.in_atomic_block else time.monotonic()
+        scoped = _request_versions()
+        if scoped is not None:
+            scoped[self.key] = version
@@ -1,8 +1,13 @@
+from django import forms
 from django.contrib import admin
-from django.utils.html import format_html
+from django.forms.utils import flatatt
+from django.utils.html import escape, format_html, format_html_join
+from django.utils.safestring import mark_safe
+from . import search
+from .category_tree import get_tree
 from .models import (
     Brand, Category, Product, ProductImage,
-    ProductVariant, Tag, Wishlist, ProductView
+    ProductVariant, StockAlert, Tag, Wishlist, ProductView
 )
 
 @admin.register(Brand)
@@ -33,15 +38,63 @@ class BrandAdmin(admin.ModelAdmin):
     )
 
 
+class ParentCategorySelect(forms.Select):
+    # The changelist renders one parent select per row, each listing every
+    # category. The option markup is built once per distinct choice list and
+    # each row only marks its own value, instead of rendering a template per option.
+    _rendered = {'choices': None, 'options': ''}
+
+    def options_html(self):
+        choices = list(self.choices)
+        if self._rendered['choices'] != choices:
+            options = format_html_join('', '<option value="{}">{}</option>', choices)
+            self._rendered.update(choices=choices, options=options)
+        return self._rendered['options']
+
+    def render(self, name, value, attrs=None, renderer=None):
+        if any(isinstance(label, (list, tuple)) for _, label in self.choices):
+            return super().render(name, value, attrs, renderer)
+        options = self.options_html()
+        value = escape('' if value is None else value)
+        marker = f'<option value="{value}">'
+        options = options.replace(marker, f'<option value="{value}" selected>', 1)
+        final_attrs = self.build_attrs(self.attrs, {**(attrs or {}), 'name': name})
+        return mark_safe(f'<select{flatatt(final_attrs)}>{options}</select>')
+
+
+class ParentCategoryFilter(admin.SimpleListFilter):
+    title = 'Parent Category'
+    parameter_name = 'parent__id__exact'
+
+    def lookups(self, request, model_admin):
+        return get_tree().choices()
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(parent_id=self.value())
+        return queryset
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['id','name','parent','order','is_active', 'created_at','updated_at']
-    list_filter = ['id','is_active','created_at','updated_at','parent']
+    list_filter = ['id','is_active','created_at','updated_at',ParentCategoryFilter]
     search_fields = ['name','slug','id']
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ('created_at', 'updated_at',)
     list_editable = ['is_active' , 'order' , 'parent']
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'parent' and not field.queryset.query.has_filters():
+            # every changelist row gets this select; build it from the
+            # snapshot instead of one query per row. Only valid while the
+            # queryset is the whole category table.
+            field.choices = [('', field.empty_label)] + get_tree().choices()
+            field.widget = ParentCategorySelect(choices=field.choices)
+            field.widget.is_required = field.required
+        return field
+
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1
@@ -62,10 +115,11 @@ class ProductAdmin(admin.ModelAdmin):
         'is_active', 'is_featured'
     ]
     list_filter = [
-        'is_active', 'is_featured', 'category',
+        'is_active', 'is_featured', 'stock_state', 'category',
         'brand','created_at'
     ]
-    search_fields = ['name','category','brand','is_active' ]
+    search_fields = ['name', 'sku']
+    list_select_related = ['category__parent', 'brand']
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['is_active', 'is_featured']
 
@@ -117,10 +171,10 @@ class ProductAdmin(admin.ModelAdmin):
     price_display.short_description = 'Price'
 
     def stock_status(self, obj):
-        if obj.stock == 0:
+        if obj.stock_state == 'out':
             color = 'red'
             text = 'Unavailable'
-        elif obj.is_low_stock():
+        elif obj.stock_state == 'low':
             color = 'orange'
             text = f'less ({obj.stock})'
         else:
@@ -134,6 +188,12 @@ class ProductAdmin(admin.ModelAdmin):
 
     stock_status.short_description = 'available'
 
+    def get_search_results(self, request, queryset, search_term):
+        # the full-text index covers name, description, brand, category, tags and sku
+        if not search_term.strip():
+            return queryset, False
+        return search.filter_products(queryset, search_term), False
+
 
 
 @admin.register(Tag)
@@ -149,6 +209,7 @@ class WishlistAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['user__username', 'product__name']
     raw_id_fields = ['user', 'product']
+    list_select_related = ['user', 'product']
 
 
 @admin.register(ProductView)
@@ -157,4 +218,15 @@ class ProductViewAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['product__name', 'ip_address']
     raw_id_fields = ['product', 'user']
-    date_hierarchy = 'created_at'
\ No newline at end of file
+    list_select_related = ['product', 'user']
+    date_hierarchy = 'created_at'
+
+
+@admin.register(StockAlert)
+class StockAlertAdmin(admin.ModelAdmin):
+    list_display = ['product', 'previous_state', 'state', 'stock', 'created_at']
+    list_filter = ['state', 'created_at']
+    search_fields = ['product__name']
+    raw_id_fields = ['product']
+    list_select_related = ['product']
+    date_hierarchy = 'created_at'
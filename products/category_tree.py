@@ -0,0 +1,146 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.db import transaction
+
+from beauty_salon_project.versions import SharedVersion
+
+from .models import Category
+
+# Immutable snapshot of the whole category tree, built from one query and
+# kept per process. Every worker compares its copy against a version key in
+# the shared Django cache (see beauty_salon_project.versions); the Category
+# signal handlers bump that key. Menus, breadcrumbs and the admin read the
+# snapshot instead of walking ``parent``.
+
+VERSION_KEY = 'products:category-tree-version'
+SEPARATOR = ' > '
+
+CategoryNode = namedtuple('CategoryNode', [
+    'id', 'name', 'slug', 'parent_id', 'depth', 'order', 'icon', 'is_active',
+    'visible', 'label', 'breadcrumb', 'ancestor_ids', 'child_ids', 'descendant_ids',
+])
+
+
+class CategoryTree:
+
+    def __init__(self, nodes, root_ids):
+        self.nodes = MappingProxyType(nodes)
+        self.root_ids = root_ids
+        self.by_slug = MappingProxyType({node.slug: node for node in nodes.values()})
+
+    def __contains__(self, category_id):
+        return category_id in self.nodes
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+    def children(self, category_id, visible_only=True):
+        ids = self.root_ids if category_id is None else self.nodes[category_id].child_ids
+        return [self.nodes[pk] for pk in ids if self.nodes[pk].visible or not visible_only]
+
+    def ancestors(self, category_id, include_self=False):
+        node = self.nodes[category_id]
+        ids = node.ancestor_ids + ((node.id,) if include_self else ())
+        return [self.nodes[pk] for pk in ids]
+
+    def breadcrumb(self, category_id):
+        node = self.nodes.get(category_id)
+        return node.breadcrumb if node else ''
+
+    def label(self, category_id):
+        node = self.nodes.get(category_id)
+        return node.label if node else ''
+
+    def subtree_ids(self, category_id, visible_only=False):
+        node = self.nodes[category_id]
+        ids = (node.id,) + node.descendant_ids
+        if visible_only:
+            return tuple(pk for pk in ids if self.nodes[pk].visible)
+        return ids
+
+    def menu(self, category_id=None):
+        # nested (node, children) pairs of the visible tree
+        return [(node, self.menu(node.id)) for node in self.children(category_id)]
+
+    def choices(self):
+        # (id, label) pairs in tree order, as the parent select shows them
+        ordered = []
+        stack = list(reversed(self.root_ids))
+        while stack:
+            node = self.nodes[stack.pop()]
+            ordered.append((node.id, node.label))
+            stack.extend(reversed(node.child_ids))
+        return ordered
+
+
+def sort_key(row):
+    return (row['order'] is None, row['order'] or 0, row['name'])
+
+
+def build():
+    rows = list(Category.objects.order_by().values(
+        'id', 'name', 'slug', 'parent_id', 'depth', 'path', 'order', 'icon', 'is_active'))
+    by_id = {row['id']: row for row in rows}
+    child_ids = {row['id']: [] for row in rows}
+    root_ids = []
+    for row in sorted(rows, key=sort_key):
+        if row['parent_id'] in child_ids:
+            child_ids[row['parent_id']].append(row['id'])
+        else:
+            root_ids.append(row['id'])
+
+    # parents before children, so every node can extend its parent's data
+    descendant_ids = {row['id']: [] for row in rows}
+    nodes = {}
+    for row in sorted(rows, key=lambda row: row['depth']):
+        parent = nodes.get(row['parent_id'])
+        ancestor_ids = parent.ancestor_ids + (parent.id,) if parent else ()
+        for ancestor_id in ancestor_ids:
+            descendant_ids[ancestor_id].append(row['id'])
+        nodes[row['id']] = CategoryNode(
+            id=row['id'], name=row['name'], slug=row['slug'], parent_id=row['parent_id'],
+            depth=row['depth'], order=row['order'], icon=row['icon'], is_active=row['is_active'],
+            visible=row['is_active'] and (parent is None or parent.visible),
+            label=f"{parent.name}{SEPARATOR}{row['name']}" if parent else row['name'],
+            breadcrumb=f"{parent.breadcrumb}{SEPARATOR}{row['name']}" if parent else row['name'],
+            ancestor_ids=ancestor_ids, child_ids=tuple(child_ids[row['id']]), descendant_ids=(),
+        )
+    for pk, ids in descendant_ids.items():
+        # descendants in path order, i.e. depth first
+        nodes[pk] = nodes[pk]._replace(descendant_ids=tuple(sorted(ids, key=lambda i: by_id[i]['path'])))
+    return CategoryTree(nodes, tuple(root_ids))
+
+
+shared_version = SharedVersion(VERSION_KEY)
+_lock = threading.Lock()
+_state = {'version': None, 'tree': None}
+
+
+def current_version():
+    return shared_version.get()
+
+
+def _bump():
+    shared_version.bump()
+    with _lock:
+        _state.update(version=None, tree=None)
+
+
+def invalidate():
+    # bump now so this process rebuilds inside the current transaction, and
+    # again after commit so other workers cannot keep a pre-commit copy
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def get_tree():
+    version = current_version()
+    with _lock:
+        if _state['version'] == version and _state['tree'] is not None:
+            return _state['tree']
+    tree = build()
+    with _lock:
+        _state.update(version=version, tree=tree)
+    return tree
@@ -0,0 +1,231 @@
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .category_tree import get_tree
+from .models import Product
+
+# Facet counts for the catalog filters. Every process keeps a FacetIndex of
+# the active products: one int bitmap (bit n = product id n) per facet
+# value, so the products matching a filter set are a few ANDs/ORs and each
+# count is a popcount. Selections within a facet are ORed and facets are
+# ANDed; each facet is counted against the other facets' selections, so
+# choosing a brand does not hide the other brands.
+#
+# Product saves and deletes append the product id to a journal in the shared
+# Django cache (a sequence number plus one key per change and epoch). Before answering,
+# a process replays the entries it has not seen by reloading only those
+# products; it rebuilds from scratch when entries were evicted, the journal
+# is too far ahead, or the cache was cleared.
+
+FACETS = {
+    'brand': 'brand_id',
+    'category': 'category_id',
+    'skin': 'suitable_for_skin',
+    'ingredients': 'ingredients',
+    'features': 'features',
+    'how_to_use': 'how_to_use',
+}
+COLUMNS = ('pk', *FACETS.values(), 'is_available', 'price')
+
+SEQUENCE_KEY = 'products:facets:sequence'
+EPOCH_KEY = 'products:facets:epoch'
+CHANGE_KEY = 'products:facets:change:{}:{}'
+JOURNAL_TIMEOUT = 60 * 60
+MAX_REPLAY = 1000
+
+
+class FacetIndex:
+
+    def __init__(self):
+        self.all = 0
+        self.available = 0
+        self.values = {facet: {} for facet in FACETS}
+        self.rows = {}
+        self._subtrees = {}
+        self._tree = None
+
+    def add(self, pk, *row):
+        self.discard(pk)
+        *values, is_available, price = row
+        bit = 1 << pk
+        self.all |= bit
+        if is_available:
+            self.available |= bit
+        for facet, value in zip(FACETS, values):
+            if value is not None and value != '':
+                bitmaps = self.values[facet]
+                bitmaps[value] = bitmaps.get(value, 0) | bit
+        self.rows[pk] = (tuple(values), price)
+        self._subtrees.clear()
+
+    def discard(self, pk):
+        row = self.rows.pop(pk, None)
+        if row is None:
+            return
+        mask = ~(1 << pk)
+        self.all &= mask
+        self.available &= mask
+        for facet, value in zip(FACETS, row[0]):
+            bitmaps = self.values[facet]
+            if value in bitmaps:
+                bitmaps[value] &= mask
+                if not bitmaps[value]:
+                    del bitmaps[value]
+        self._subtrees.clear()
+
+    def subtree(self, category_id, tree):
+        if tree is not self._tree:
+            self._subtrees, self._tree = {}, tree
+        bits = self._subtrees.get(category_id)
+        if bits is None:
+            bits = 0
+            categories = self.values['category']
+            for pk in tree.subtree_ids(category_id):
+                bits |= categories.get(pk, 0)
+            self._subtrees[category_id] = bits
+        return bits
+
+    def value_bits(self, facet, value, tree):
+        if facet == 'category':
+            return self.subtree(value, tree) if value in tree else 0
+        return self.values[facet].get(value, 0)
+
+    def price_bits(self, min_price=None, max_price=None):
+        bits = 0
+        for pk, (_, price) in self.rows.items():
+            if (min_price is None or price >= min_price) and (max_price is None or price <= max_price):
+                bits |= 1 << pk
+        return bits
+
+    def selection_bits(self, facet, values, tree):
+        bits = 0
+        for value in values:
+            bits |= self.value_bits(facet, value, tree)
+        return bits
+
+    def counts(self, selections, base=None, tree=None):
+        # {facet: {value: count}} for every facet, plus the matching total
+        tree = tree or get_tree()
+        base = self.all if base is None else base & self.all
+        chosen = {
+            facet: self.selection_bits(facet, values, tree)
+            for facet, values in selections.items() if values
+        }
+        matching = base
+        for bits in chosen.values():
+            matching &= bits
+
+        result = {'total': matching.bit_count()}
+        for facet in FACETS:
+            scope = base
+            for other, bits in chosen.items():
+                if other != facet:
+                    scope &= bits
+            if facet == 'category':
+                values = {node_id: self.subtree(node_id, tree) for node_id in tree.nodes}
+            else:
+                values = self.values[facet]
+            counts = {}
+            for value, bits in values.items():
+                count = (scope & bits).bit_count()
+                if count:
+                    counts[value] = count
+            result[facet] = counts
+        return result
+
+
+def load(product_ids=None):
+    rows = Product.objects.filter(is_active=True)
+    if product_ids is not None:
+        rows = rows.filter(pk__in=product_ids)
+    return rows.order_by().values_list(*COLUMNS)
+
+
+def build():
+    index = FacetIndex()
+    for row in load().iterator(chunk_size=5000):
+        index.add(*row)
+    return index
+
+
+def journal_state():
+    # one read when the journal exists; add() is a failed INSERT on the
+    # database cache, so it only runs when a key is missing
+    keys = [EPOCH_KEY, SEQUENCE_KEY]
+    state = cache.get_many(keys)
+    if len(state) < len(keys):
+        cache.add(EPOCH_KEY, uuid.uuid4().hex, None)
+        cache.add(SEQUENCE_KEY, 0, None)
+        state = cache.get_many(keys)
+    return state.get(EPOCH_KEY), state.get(SEQUENCE_KEY)
+
+
+def record_change(product_ids):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    epoch, _ = journal_state()
+    try:
+        sequence = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # the key vanished in between; a new epoch forces every process to rebuild
+        cache.set(EPOCH_KEY, uuid.uuid4().hex, None)
+        return
+    # incr is a read-then-write on some backends (the database cache), so two
+    # writers can get the same number; the loser starts a new epoch
+    if not cache.add(CHANGE_KEY.format(epoch, sequence), product_ids, JOURNAL_TIMEOUT):
+        cache.set(EPOCH_KEY, uuid.uuid4().hex, None)
+
+
+def record_change_on_commit(product_ids):
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: record_change(product_ids))
+
+
+# replays patch the index in place, so readers hold the lock as well
+_lock = threading.RLock()
+_state = {'epoch': None, 'sequence': 0, 'index': None}
+
+
+def replay(index, epoch, first, last):
+    keys = [CHANGE_KEY.format(epoch, sequence) for sequence in range(first, last + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return False
+    product_ids = {pk for ids in changes.values() for pk in ids}
+    for pk in product_ids:
+        index.discard(pk)
+    for row in load(product_ids):
+        index.add(*row)
+    return True
+
+
+def get_index():
+    epoch, sequence = journal_state()
+    with _lock:
+        index = _state['index']
+        seen = _state['sequence']
+        if index is not None and _state['epoch'] == epoch and seen == sequence:
+            return index
+        if (index is None or _state['epoch'] != epoch or sequence < seen
+                or sequence - seen > MAX_REPLAY or not replay(index, epoch, seen + 1, sequence)):
+            index = build()
+        _state.update(epoch=epoch, sequence=sequence, index=index)
+        return index
+
+
+def facet_counts(selections, is_available=None, min_price=None, max_price=None, tree=None):
+    tree = tree or get_tree()
+    with _lock:
+        index = get_index()
+        base = index.all
+        if is_available:
+            base &= index.available
+        elif is_available is not None:
+            base &= ~index.available
+        if min_price is not None or max_price is not None:
+            base &= index.price_bits(min_price, max_price)
+        return index.counts(selections, base, tree)
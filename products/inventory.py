@@ -0,0 +1,177 @@
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from .models import Product, StockAlert, stock_state_expression
+
+# Stock changes never read-modify-write: a reservation is a conditional
+# ``UPDATE ... SET stock = stock - n WHERE stock >= n``, so concurrent
+# checkouts cannot oversell. Cart lines with the same model and quantity
+# share one UPDATE; only when such a batch comes up short is it rolled back
+# to its savepoint and retried line by line to find the lines that failed.
+# Product.stock_state is rewritten by the same UPDATE, and every line whose
+# state changed gets a StockAlert before the transaction commits.
+
+StockShortage = namedtuple('StockShortage', ['model', 'pk', 'requested', 'available'])
+ReservationResult = namedtuple('ReservationResult', ['reserved', 'failed'])
+
+
+class InsufficientStock(Exception):
+
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__(', '.join(
+            f"{shortage.model._meta.model_name} {shortage.pk}: "
+            f"requested {shortage.requested}, available {shortage.available}"
+            for shortage in failed
+        ))
+
+
+def cart_quantities(items):
+    # items: (Product or ProductVariant instance, quantity) pairs
+    quantities = defaultdict(int)
+    instances = defaultdict(list)
+    for item, quantity in items:
+        if quantity <= 0:
+            raise ValueError(f'quantity must be positive, got {quantity}')
+        key = (type(item), item.pk)
+        quantities[key] += quantity
+        instances[key].append(item)
+    return quantities, instances
+
+
+def stock_changes(model, delta):
+    changes = {'stock': Coalesce(F('stock'), 0) + delta}
+    if model is Product:
+        changes['stock_state'] = stock_state_expression(delta)
+    return changes
+
+
+def decrement(model, pks, quantity):
+    return model.objects.filter(pk__in=pks, stock__gte=quantity).update(**stock_changes(model, -quantity))
+
+
+class ShortBatch(Exception):
+    pass
+
+
+def reserve_batch(model, pks, quantity):
+    # pks that could not be decremented; the others are decremented
+    if len(pks) == 1:
+        return [] if decrement(model, pks, quantity) else pks
+    try:
+        with transaction.atomic():
+            if decrement(model, pks, quantity) != len(pks):
+                raise ShortBatch
+        return []
+    except ShortBatch:
+        return [pk for pk in pks if not decrement(model, [pk], quantity)]
+
+
+def current_stock(keys):
+    stock = {}
+    by_model = defaultdict(list)
+    for model, pk in keys:
+        by_model[model].append(pk)
+    for model, pks in by_model.items():
+        for pk, value in model.objects.filter(pk__in=pks).values_list('pk', 'stock'):
+            stock[model, pk] = value or 0
+    return stock
+
+
+def record_transitions(deltas):
+    # deltas: {product_id: applied stock change}. The rows are still locked
+    # by our UPDATEs, so stock - delta is exactly the stock before them.
+    if not deltas:
+        return []
+    alerts = []
+    rows = Product.objects.filter(pk__in=deltas).values_list('pk', 'stock', 'low_stock_threshold', 'stock_state')
+    for pk, stock, threshold, state in rows:
+        previous = Product.stock_state_for((stock or 0) - deltas[pk], threshold)
+        if previous != state:
+            alerts.append(StockAlert(product_id=pk, previous_state=previous, state=state, stock=stock or 0))
+    return StockAlert.objects.bulk_create(alerts)
+
+
+def refresh_instances(instances, stock):
+    for key, items in instances.items():
+        for item in items:
+            item.stock = stock.get(key, item.stock)
+
+
+def reserve_stock(items, allow_partial=False):
+    # Takes the whole cart's stock in one transaction. Without
+    # ``allow_partial`` any shortage rolls everything back and raises
+    # InsufficientStock; with it the available lines are kept and the rest
+    # reported. Passed instances get their stock refreshed either way.
+    quantities, instances = cart_quantities(items)
+    batches = defaultdict(list)
+    for (model, pk), quantity in sorted(quantities.items(), key=lambda entry: (entry[0][0].__name__, entry[0][1])):
+        batches[model, quantity].append(pk)
+
+    failed_keys = []
+    try:
+        with transaction.atomic():
+            for (model, quantity), pks in batches.items():
+                failed_keys += [(model, pk) for pk in reserve_batch(model, pks, quantity)]
+            failed_keys_set = set(failed_keys)
+            record_transitions({
+                pk: -quantity for (model, pk), quantity in quantities.items()
+                if model is Product and (model, pk) not in failed_keys_set
+            })
+            stock = current_stock(quantities)
+            failed = [
+                StockShortage(model, pk, quantities[model, pk], stock.get((model, pk), 0))
+                for model, pk in failed_keys
+            ]
+            if failed and not allow_partial:
+                raise InsufficientStock(failed)
+    except InsufficientStock:
+        refresh_instances(instances, current_stock(quantities))
+        raise
+
+    refresh_instances(instances, stock)
+    reserved = {key: quantity for key, quantity in quantities.items() if key not in failed_keys_set}
+    return ReservationResult(reserved, failed)
+
+
+def release_stock(items):
+    # puts reserved quantities back, e.g. for a cancelled order
+    quantities, instances = cart_quantities(items)
+    with transaction.atomic():
+        for (model, pk), quantity in quantities.items():
+            model.objects.filter(pk=pk).update(**stock_changes(model, quantity))
+        record_transitions({pk: quantity for (model, pk), quantity in quantities.items() if model is Product})
+        stock = current_stock(quantities)
+    refresh_instances(instances, stock)
+
+
+def reconcile_stock_states():
+    # repairs rows whose stock was changed behind stock_state's back (raw
+    # UPDATEs, fixtures) and records their transitions like any other change
+    with transaction.atomic():
+        rows = list(
+            Product.objects.stale_stock_state().select_for_update()
+            .values_list('pk', 'stock', 'low_stock_threshold', 'stock_state')
+        )
+        alerts = [
+            StockAlert(
+                product_id=pk, previous_state=state,
+                state=Product.stock_state_for(stock, threshold), stock=stock or 0,
+            )
+            for pk, stock, threshold, state in rows
+        ]
+        if rows:
+            Product.objects.filter(pk__in=[row[0] for row in rows]).update(stock_state=stock_state_expression())
+        StockAlert.objects.bulk_create(alerts)
+    return alerts
+
+
+def alerts_since(last_id, limit=1000):
+    # the alert feed, read by id so consumers can resume from a checkpoint
+    return list(
+        StockAlert.objects.filter(pk__gt=last_id).select_related('product')
+        .order_by('pk')[:limit]
+    )
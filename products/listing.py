@@ -0,0 +1,128 @@
+import base64
+import json
+from collections import namedtuple
+from decimal import InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Prefetch, Q, Window
+from django.db.models.functions import RowNumber
+
+from .category_tree import get_tree
+from .models import Product, ProductImage
+
+# Product listing with keyset ("seek") pagination: a page continues from the
+# sort value and id of the previous page's last row instead of an OFFSET,
+# so page 1000 costs the same index range scan as page 1. Nullable sort
+# columns sort their NULLs last in either direction.
+
+Sort = namedtuple('Sort', ['field', 'descending'])
+
+SORTS = {
+    'newest': Sort('created_at', True),
+    'best_selling': Sort('sales_count', True),
+    'price': Sort('price', False),
+    '-price': Sort('price', True),
+}
+DEFAULT_SORT = 'newest'
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+Page = namedtuple('Page', ['products', 'next_cursor'])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort, product):
+    field = Product._meta.get_field(SORTS[sort].field)
+    value = getattr(product, field.attname)
+    data = [sort, None if value is None else field.value_to_string(product), product.pk]
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        cursor_sort, value, pk = data
+        field = Product._meta.get_field(SORTS[sort].field)
+        # to_python raises ValidationError for garbage and for NaN/Infinity
+        value = None if value in (None, '') else field.to_python(value)
+        pk = int(pk)
+    except (ValueError, TypeError, KeyError, AttributeError, ValidationError, InvalidOperation):
+        raise InvalidCursor('malformed cursor')
+    if cursor_sort != sort:
+        raise InvalidCursor('cursor belongs to another sort order')
+    return value, pk
+
+
+def order(queryset, sort):
+    field, descending = SORTS[sort]
+    # an explicit NULLS LAST on a NOT NULL column stops SQLite from
+    # reading the rows in index order
+    nulls_last = True if Product._meta.get_field(field).null else None
+    if descending:
+        return queryset.order_by(F(field).desc(nulls_last=nulls_last), '-pk')
+    return queryset.order_by(F(field).asc(nulls_last=nulls_last), 'pk')
+
+
+def seek(queryset, sort, value, pk):
+    # rows strictly after (value, pk) in the sort order
+    field, descending = SORTS[sort]
+    op = 'lt' if descending else 'gt'
+    if value is None:
+        return queryset.filter(**{f'{field}__isnull': True, f'pk__{op}': pk})
+    after = Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'pk__{op}': pk})
+    if Product._meta.get_field(field).null:
+        return queryset.filter(after | Q(**{f'{field}__isnull': True}))
+    # the outer bound gives the index a range to start from
+    return queryset.filter(Q(**{f'{field}__{op}e': value}), after)
+
+
+def first_images():
+    ranked = ProductImage.objects.annotate(
+        position=Window(RowNumber(), partition_by=F('product_id'), order_by=[F('order').asc(), F('pk').asc()]),
+    )
+    return Prefetch('images', queryset=ranked.filter(position=1), to_attr='first_images')
+
+
+def filter_products(queryset, category=None, brands=None, skin=None, is_active=True,
+                    is_available=None, min_price=None, max_price=None,
+                    ingredients=None, features=None, how_to_use=None):
+    if category is not None:
+        tree = get_tree()
+        if category not in tree:
+            return queryset.none()
+        queryset = queryset.filter(category_id__in=tree.subtree_ids(category))
+    if brands:
+        queryset = queryset.filter(brand_id__in=brands)
+    if skin:
+        queryset = queryset.filter(suitable_for_skin=skin)
+    if ingredients:
+        queryset = queryset.filter(ingredients__in=ingredients)
+    if features:
+        queryset = queryset.filter(features__in=features)
+    if how_to_use:
+        queryset = queryset.filter(how_to_use__in=how_to_use)
+    if is_active is not None:
+        queryset = queryset.filter(is_active=is_active)
+    if is_available is not None:
+        queryset = queryset.filter(is_available=is_available)
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    return queryset
+
+
+def product_page(sort=DEFAULT_SORT, cursor=None, limit=DEFAULT_PAGE_SIZE, **filters):
+    # two queries: the page (with brand and category joined) and its first images
+    queryset = filter_products(Product.objects.all(), **filters)
+    if cursor:
+        queryset = seek(queryset, sort, *decode_cursor(cursor, sort))
+    rows = list(
+        order(queryset, sort).select_related('brand', 'category')
+        .prefetch_related(first_images())[:limit + 1]
+    )
+    next_cursor = encode_cursor(sort, rows[limit - 1]) if len(rows) > limit else None
+    return Page(rows[:limit], next_cursor)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index'
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            self.stdout.write(f'{connection.vendor} has no FTS5 index; search uses icontains lookups')
+            return
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products'))
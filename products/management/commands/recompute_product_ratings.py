@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from beauty_salon_project.ratings import recompute_ratings
+from products.models import Product, ProductReview
+
+
+class Command(BaseCommand):
+    help = 'Rebuild product rating aggregates from individual reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = recompute_ratings(Product, ProductReview.objects.all(), 'product_id',
+                                  chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed ratings for {fixed} products'))
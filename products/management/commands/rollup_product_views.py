@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.rollups import purge_raw_views, rollup_views
+
+
+class Command(BaseCommand):
+    help = 'Roll raw product views up into hourly/daily counts and purge old raw rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument('--retention-days', type=int,
+                            help='delete rolled-up raw views older than this many days')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='rows per delete statement')
+
+    def handle(self, *args, **options):
+        consumed = rollup_views(options['batch_size'])
+        self.stdout.write(f'Rolled up {consumed} views')
+        if options['retention_days'] is not None:
+            deleted = purge_raw_views(options['retention_days'], options['chunk_size'])
+            self.stdout.write(f'Deleted {deleted} raw views')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from products.inventory import alerts_since, reconcile_stock_states
+from products.models import Product, RollupCheckpoint
+
+CHECKPOINT = 'stock-alerts'
+
+
+class Command(BaseCommand):
+    help = 'Report low/out counts and print new stock alerts; --repair reconciles stale states first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='first repair stock states changed by raw UPDATEs (scans every product)')
+        parser.add_argument('--alerts', action='store_true', help='print alerts since the last run and advance the checkpoint')
+        parser.add_argument('--limit', type=int, default=1000, help='maximum alerts to print')
+
+    def handle(self, *args, **options):
+        if options['repair']:
+            repaired = reconcile_stock_states()
+            self.stdout.write(f'Repaired {len(repaired)} stale stock states')
+        counts = dict(
+            Product.objects.filter(is_active=True).needs_restock()
+            .values_list('stock_state').annotate(total=Count('pk')).order_by()
+        )
+        self.stdout.write(f"Low stock: {counts.get('low', 0)}, out of stock: {counts.get('out', 0)}")
+        if not options['alerts']:
+            return
+        checkpoint, _ = RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+        alerts = alerts_since(checkpoint.last_id, options['limit'])
+        for alert in alerts:
+            self.stdout.write(f'{alert.created_at:%Y-%m-%d %H:%M} {alert.product.name}: {alert.previous_state} -> {alert.state} ({alert.stock})')
+        if alerts:
+            RollupCheckpoint.objects.filter(pk=checkpoint.pk).update(last_id=alerts[-1].pk, updated_at=timezone.now())
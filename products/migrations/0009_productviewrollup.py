@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_alter_productview_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='name')),
+                ('last_id', models.PositiveBigIntegerField(default=0, verbose_name='last id')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'rollup checkpoint',
+                'verbose_name_plural': 'rollup checkpoints',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductViewRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'hour'), ('day', 'day')], max_length=10, verbose_name='period')),
+                ('bucket', models.DateTimeField(verbose_name='bucket')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='views')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_rollups', to='products.product', verbose_name='product')),
+            ],
+            options={
+                'verbose_name': 'view rollup',
+                'verbose_name_plural': 'view rollups',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['period', 'bucket'], name='products_pr_period_26a856_idx')],
+                'unique_together': {('period', 'product', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_productreview_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='trend_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='trend score'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-trend_score'], name='products_pr_is_acti_3d3a98_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'is_active', '-trend_score'], name='products_pr_categor_200699_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:51
+
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    rows = list(Category.objects.only('id', 'parent_id'))
+    children = {}
+    for row in rows:
+        children.setdefault(row.parent_id, []).append(row)
+    level, path, depth = children.get(None, []), {None: ''}, {None: -1}
+    while level:
+        for row in level:
+            row.path = f"{path[row.parent_id]}{row.pk}/"
+            row.depth = depth[row.parent_id] + 1
+            path[row.pk], depth[row.pk] = row.path, row.depth
+        level = [child for row in level for child in children.get(row.pk, [])]
+    Category.objects.bulk_update([row for row in rows if row.pk in path], ['path', 'depth'], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_trend_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='depth'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='path'),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:54
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5(
+            name, description, brand, category, tags,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    schema_editor.execute("""
+        INSERT INTO products_product_fts (rowid, name, description, brand, category, tags)
+        SELECT p.id, p.name, COALESCE(p.description, ''), COALESCE(b.name, ''), COALESCE(c.name, ''),
+               COALESCE((SELECT group_concat(t.name, ' ') FROM products_tag t WHERE t.product_id = p.id), '')
+        FROM products_product p
+        LEFT JOIN products_brand b ON b.id = p.brand_id
+        LEFT JOIN products_category c ON c.id = p.category_id
+    """)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def backfill_stock_state(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.filter(stock__gt=F('low_stock_threshold')).update(stock_state='in_stock')
+    Product.objects.filter(stock__gt=0, stock__lte=F('low_stock_threshold')).update(stock_state='low')
+    Product.objects.filter(Q(stock__isnull=True) | Q(stock__lte=0)).update(stock_state='out')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_state', models.CharField(choices=[('in_stock', 'in stock'), ('low', 'low stock'), ('out', 'out of stock')], max_length=10, verbose_name='previous state')),
+                ('state', models.CharField(choices=[('in_stock', 'in stock'), ('low', 'low stock'), ('out', 'out of stock')], max_length=10, verbose_name='state')),
+                ('stock', models.IntegerField(verbose_name='stock')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'stock alert',
+                'verbose_name_plural': 'stock alerts',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_state',
+            field=models.CharField(choices=[('in_stock', 'in stock'), ('low', 'low stock'), ('out', 'out of stock')], default='out', editable=False, max_length=10, verbose_name='stock state'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock_state', 'is_active'], name='products_pr_stock_s_65deb3_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockalert',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='products.product', verbose_name='product'),
+        ),
+        migrations.RunPython(backfill_stock_state, migrations.RunPython.noop),
+    ]
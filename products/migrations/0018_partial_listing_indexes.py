@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_trending_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_is_acti_079805_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_is_acti_27194e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_is_acti_e059f3_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_categor_64a056_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='product_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-sales_count', '-id'], name='product_best_selling_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price', 'id'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-created_at', '-id'], name='product_category_newest_idx'),
+        ),
+    ]
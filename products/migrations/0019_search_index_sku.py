@@ -0,0 +1,45 @@
+from django.db import migrations
+
+COLUMNS = ['name', 'description', 'brand', 'category', 'tags']
+SOURCES = [
+    'p.name', "COALESCE(p.description, '')", "COALESCE(b.name, '')", "COALESCE(c.name, '')",
+    "COALESCE((SELECT group_concat(t.name, ' ') FROM products_tag t WHERE t.product_id = p.id), '')",
+]
+
+
+def recreate(schema_editor, columns, sources):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+    schema_editor.execute(f"""
+        CREATE VIRTUAL TABLE products_product_fts USING fts5(
+            {', '.join(columns)},
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    schema_editor.execute(f"""
+        INSERT INTO products_product_fts (rowid, {', '.join(columns)})
+        SELECT p.id, {', '.join(sources)}
+        FROM products_product p
+        LEFT JOIN products_brand b ON b.id = p.brand_id
+        LEFT JOIN products_category c ON c.id = p.category_id
+    """)
+
+
+def add_sku(apps, schema_editor):
+    recreate(schema_editor, [*COLUMNS, 'sku'], [*SOURCES, "COALESCE(p.sku, '')"])
+
+
+def remove_sku(apps, schema_editor):
+    recreate(schema_editor, COLUMNS, SOURCES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_partial_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_sku, remove_sku),
+    ]
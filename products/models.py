@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator ,RegexValidator
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce, Concat, Substr
+from django.db.models.lookups import LessThanOrEqual
 from django.utils.text import slugify
 
 
@@ -39,6 +43,13 @@ class Brand(models.Model):
     def __str__(self):
         return self.name
 
+class CategoryManager(models.Manager):
+    def get_queryset(self):
+        # __str__ shows the parent name, so choice lists and admin columns
+        # would otherwise fetch every parent separately
+        return super().get_queryset().select_related('parent')
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100 , unique=True , verbose_name="category")
     slug = models.SlugField(max_length=100, unique=True , verbose_name="slug")
@@ -48,29 +59,102 @@ class Category(models.Model):
     icon = models.CharField(max_length=100 , blank=True , null=True , verbose_name="icon")
     order = models.PositiveIntegerField(blank=True , null=True , verbose_name="order")
     is_active = models.BooleanField(default=True , verbose_name="active")
+    # materialized path of ancestor ids including this one, e.g. "1/5/12/";
+    # a subtree is every row whose path starts with the root's path
+    path = models.CharField(max_length=255 , blank=True , editable=False , db_index=True , verbose_name="path")
+    depth = models.PositiveSmallIntegerField(default=0 , editable=False , verbose_name="depth")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CategoryManager()
+
     class Meta:
         verbose_name = "category"
         verbose_name_plural = "categories"
         ordering = ['name','order']
 
     def __str__(self):
-        if self.parent:
+        if self.parent_id:
             return f"{self.parent.name} > {self.name}"
         return self.name
 
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.path.split('/') if pk][:-1]
+
+    def get_ancestors(self, include_self=False):
+        ids = self.ancestor_ids() + ([self.pk] if include_self else [])
+        return Category.objects.filter(pk__in=ids).order_by('depth')
+
+    def get_breadcrumbs(self):
+        return list(self.get_ancestors(include_self=True))
+
+    def get_descendants(self, include_self=False):
+        descendants = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
     def get_all_children(self):
-        children = list(self.children.all())
-        for child in list(children):
-            children.extend(child.get_all_children())
-        return children
+        return list(self.get_descendants().order_by('path'))
+
+    def get_products(self):
+        return Product.objects.filter(category__path__startswith=self.path)
+
+    def clean(self):
+        if self.path and self.parent_id and self.parent.path.startswith(self.path):
+            raise ValidationError({'parent': 'A category cannot be moved under itself or its descendants.'})
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        parent_path, parent_depth = '', -1
+        if self.parent_id:
+            parent_path, parent_depth = Category.objects.values_list('path', 'depth').get(pk=self.parent_id)
+        previous = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() if self.pk else None
+        if previous and parent_path.startswith(previous):
+            raise ValueError('A category cannot be moved under itself or its descendants.')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            path = f"{parent_path}{self.pk}/"
+            depth = parent_depth + 1
+            if path == previous and depth == self.depth and self.path == path:
+                return
+            Category.objects.filter(pk=self.pk).update(path=path, depth=depth)
+            if previous and previous != path:
+                # move the whole subtree with one UPDATE
+                Category.objects.filter(path__startswith=previous).exclude(pk=self.pk).update(
+                    path=Concat(Value(path), Substr('path', len(previous) + 1)),
+                    depth=F('depth') + depth - (len(previous.split('/')) - 2),
+                )
+            self.path, self.depth = path, depth
+
+
+def stock_state_expression(delta=0):
+    # the stock_state of ``stock + delta``; inside an UPDATE that also sets
+    # stock, both sides see the old row, so pass the same delta
+    stock = Coalesce(F('stock'), 0) + delta
+    return Case(
+        When(LessThanOrEqual(stock, 0), then=Value('out')),
+        When(LessThanOrEqual(stock, F('low_stock_threshold')), then=Value('low')),
+        default=Value('in_stock'),
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def out_of_stock(self):
+        return self.filter(Q(stock__isnull=True) | Q(stock__lte=0))
+
+    def low_stock(self):
+        return self.filter(stock__gt=0, stock__lte=F('low_stock_threshold'))
+
+    def needs_restock(self):
+        # low or out, read from the maintained and indexed column
+        return self.filter(stock_state__in=('low', 'out'))
+
+    def stale_stock_state(self):
+        # rows changed by plain UPDATEs that did not maintain stock_state
+        return self.alias(expected_state=stock_state_expression()).exclude(stock_state=F('expected_state'))
 
 
 class Product(models.Model):
@@ -119,6 +203,12 @@ class Product(models.Model):
     #موجودی
     stock = models.PositiveIntegerField(default=0,blank=True , null=True , verbose_name="stock")
     low_stock_threshold = models.PositiveIntegerField(default=10  , verbose_name="low stock threshold")
+    STOCK_STATE_CHOICES = (
+        ('in_stock', 'in stock'),
+        ('low', 'low stock'),
+        ('out', 'out of stock'),
+    )
+    stock_state = models.CharField(max_length=10 , choices=STOCK_STATE_CHOICES , default='out' , editable=False , verbose_name="stock state")
 
     #ability
     sku = models.CharField(unique=True,validators=[Sku_validator])
@@ -154,10 +244,15 @@ class Product(models.Model):
 
     view_count = models.PositiveIntegerField(default=0 , blank=True , null=True , verbose_name="views")
     sales_count = models.PositiveIntegerField(default=0 , blank=True , null=True , verbose_name="sales")
+    trend_score = models.FloatField(default=0 , editable=False , verbose_name="trend score")
     rating = models.DecimalField(max_digits=3 , decimal_places=2 , blank=True , null=True ,
                                  default=0.00,validators=[MinValueValidator(0), MaxValueValidator(5)],verbose_name="rating")
 
     rating_count = models.PositiveIntegerField(default=0 , blank=True , null=True , verbose_name="rating")
+    rating_sum = models.PositiveIntegerField(default=0 , verbose_name="rating sum")
+    # ratings without a ProductReview row; see beauty_salon_project.ratings
+    baseline_rating_sum = models.PositiveIntegerField(default=0 , editable=False , verbose_name="baseline rating sum")
+    baseline_rating_count = models.PositiveIntegerField(default=0 , editable=False , verbose_name="baseline rating count")
 
 
     #status
@@ -175,11 +270,54 @@ class Product(models.Model):
             models.Index(fields=['slug']),
             models.Index(fields=['category', 'is_active']),
             models.Index(fields=['-sales_count']),
+            # trending top-K; partial because the ORM emits a bare "WHERE is_active"
+            models.Index(fields=['-trend_score'], condition=models.Q(is_active=True),
+                         name='product_trending_idx'),
+            models.Index(fields=['category', '-trend_score'], condition=models.Q(is_active=True),
+                         name='product_category_trending_idx'),
+            # keyset pagination of the product listing, one per sort order;
+            # partial for the same reason as the trending indexes
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='product_newest_idx'),
+            models.Index(fields=['-sales_count', '-id'], condition=models.Q(is_active=True),
+                         name='product_best_selling_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(is_active=True),
+                         name='product_price_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='product_category_newest_idx'),
+            models.Index(fields=['stock_state', 'is_active']),
         ]
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def stock_state_for(stock, threshold):
+        if not stock or stock <= 0:
+            return 'out'
+        if stock <= threshold:
+            return 'low'
+        return 'in_stock'
+
+    def save(self, *args, **kwargs):
+        self.stock_state = self.stock_state_for(self.stock, self.low_stock_threshold)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            if not {'stock', 'low_stock_threshold'} & set(update_fields):
+                # stock untouched: no transition to record
+                return super().save(*args, **kwargs)
+            kwargs['update_fields'] = {*update_fields, 'stock_state'}
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = Product.objects.filter(pk=self.pk).values_list('stock_state', flat=True).first()
+            super().save(*args, **kwargs)
+            if previous and previous != self.stock_state:
+                StockAlert.objects.create(product=self, previous_state=previous, state=self.stock_state,
+                                          stock=self.stock or 0)
+
     def get_final_price(self):
         if self.discount_price:
             return self.discount_price
@@ -191,11 +329,13 @@ class Product(models.Model):
             return round(discount)
         return 0
 
+    # these read the instance's stock; products.inventory refreshes it on
+    # the instances it reserves for
     def is_in_stock(self):
-        return self.stock > 0
+        return (self.stock or 0) > 0
 
     def is_low_stock(self):
-        return 0 < self.stock <= self.low_stock_threshold
+        return 0 < (self.stock or 0) <= self.low_stock_threshold
 
     def get_profit_margin(self):
         if self.cost_price and self.cost_price > 0:
@@ -204,6 +344,29 @@ class Product(models.Model):
             return round(profit, 2)
         return 0
 
+class ProductReview(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE,related_name='reviews',verbose_name='product')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,related_name='product_reviews',verbose_name='user')
+    score = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)],verbose_name='score')
+    comment = models.TextField(blank=True,verbose_name='comment')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "review"
+        verbose_name_plural = "reviews"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.product_id} - {self.score}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_score = instance.__dict__.get('score')
+        instance._loaded_target = instance.__dict__.get('product_id')
+        return instance
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE,related_name='images',verbose_name='product')
     # image = models.ImageField(upload_to='products/%Y/%m/',blank=True,verbose_name='image')
@@ -286,7 +449,7 @@ class Wishlist(models.Model):
 
 class ProductView(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE,related_name='views',verbose_name='product')
-    user = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,related_name='views',verbose_name='user')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,related_name='views',null=True,blank=True,verbose_name='user')
     ip_address = models.GenericIPAddressField(verbose_name='IP address')
     session_key = models.CharField(max_length=255,blank=True,verbose_name='session key')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -300,4 +463,57 @@ class ProductView(models.Model):
             models.Index(fields=['product' , '-created_at']),
         ]
     def __str__(self):
-        return self.product.name
\ No newline at end of file
+        return self.product.name
+
+class ProductViewRollup(models.Model):
+    PERIOD_CHOICES = (
+        ('hour', 'hour'),
+        ('day', 'day'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE,related_name='view_rollups',verbose_name='product')
+    period = models.CharField(max_length=10,choices=PERIOD_CHOICES,verbose_name='period')
+    bucket = models.DateTimeField(verbose_name='bucket')
+    views = models.PositiveIntegerField(default=0,verbose_name='views')
+
+    class Meta:
+        verbose_name = "view rollup"
+        verbose_name_plural = "view rollups"
+        ordering = ['-bucket']
+        unique_together = ('period', 'product', 'bucket')
+        indexes = [
+            models.Index(fields=['period', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.period} {self.bucket}: {self.views}"
+
+
+class RollupCheckpoint(models.Model):
+    name = models.CharField(max_length=100,unique=True,verbose_name='name')
+    last_id = models.PositiveBigIntegerField(default=0,verbose_name='last id')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "rollup checkpoint"
+        verbose_name_plural = "rollup checkpoints"
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
+class StockAlert(models.Model):
+    # one row per stock_state transition, appended in the transaction that changed the stock
+    product = models.ForeignKey(Product, on_delete=models.CASCADE,related_name='stock_alerts',verbose_name='product')
+    previous_state = models.CharField(max_length=10,choices=Product.STOCK_STATE_CHOICES,verbose_name='previous state')
+    state = models.CharField(max_length=10,choices=Product.STOCK_STATE_CHOICES,verbose_name='state')
+    stock = models.IntegerField(verbose_name='stock')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "stock alert"
+        verbose_name_plural = "stock alerts"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.product_id}: {self.previous_state} -> {self.state} ({self.stock})"
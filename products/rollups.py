@@ -0,0 +1,101 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ProductView, ProductViewRollup, RollupCheckpoint
+
+CHECKPOINT = 'product-views'
+# views younger than this are left for the next run, so rows from
+# transactions that committed out of id order are not skipped
+SETTLE_DELAY = timedelta(minutes=1)
+
+
+def day_bucket(hour):
+    local = timezone.localtime(hour)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def merge_counts(counts):
+    # counts: {(period, product_id, bucket): views} added onto stored rows
+    if not counts:
+        return
+    product_ids = {product_id for _, product_id, _ in counts}
+    buckets = [bucket for _, _, bucket in counts]
+    existing = {
+        (row.period, row.product_id, row.bucket): row
+        for row in ProductViewRollup.objects.filter(
+            product_id__in=product_ids, bucket__range=(min(buckets), max(buckets)))
+    }
+    updated, created = [], []
+    for key, views in counts.items():
+        row = existing.get(key)
+        if row is None:
+            period, product_id, bucket = key
+            created.append(ProductViewRollup(period=period, product_id=product_id, bucket=bucket, views=views))
+        else:
+            row.views += views
+            updated.append(row)
+    ProductViewRollup.objects.bulk_update(updated, ['views'], batch_size=1000)
+    ProductViewRollup.objects.bulk_create(created, batch_size=1000)
+
+
+def rollup_views(batch_size=50000):
+    # Folds raw ProductView rows above the checkpoint into hourly and daily
+    # rollups, one grouped query per id batch. Returns the number of raw rows
+    # consumed.
+    checkpoint, _ = RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    settled = timezone.now() - SETTLE_DELAY
+    upper = ProductView.objects.filter(created_at__lt=settled).aggregate(Max('id'))['id__max'] or 0
+
+    consumed = 0
+    low = checkpoint.last_id
+    while low < upper:
+        high = min(low + batch_size, upper)
+        with transaction.atomic():
+            # Claim the batch before reading it. The conditional UPDATE holds
+            # the checkpoint row (on SQLite, the database) until commit, and
+            # matches nothing once an overlapping run has moved the
+            # checkpoint, so no range is counted twice.
+            claimed = RollupCheckpoint.objects.filter(pk=checkpoint.pk, last_id=low).update(
+                last_id=high, updated_at=timezone.now())
+            if not claimed:
+                break
+            hourly = (
+                ProductView.objects.filter(id__gt=low, id__lte=high)
+                .annotate(hour=TruncHour('created_at')).values('product_id', 'hour')
+                .annotate(views=Count('id')).order_by()
+            )
+            counts = defaultdict(int)
+            for row in hourly:
+                counts['hour', row['product_id'], row['hour']] += row['views']
+                counts['day', row['product_id'], day_bucket(row['hour'])] += row['views']
+                consumed += row['views']
+            merge_counts(counts)
+        low = high
+    return consumed
+
+
+def purge_raw_views(retention_days, chunk_size=10000):
+    # Deletes raw views older than the retention window that are already
+    # rolled up, in chunks to keep each transaction short.
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    last_id = RollupCheckpoint.objects.filter(name=CHECKPOINT).values_list('last_id', flat=True).first() or 0
+    stale = ProductView.objects.filter(id__lte=last_id, created_at__lt=cutoff).order_by('id')
+    deleted = 0
+    while True:
+        ids = list(stale.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += ProductView.objects.filter(id__in=ids).delete()[0]
+
+
+def most_viewed(days=7, limit=10, period='day'):
+    since = timezone.now() - timedelta(days=days)
+    return list(
+        ProductViewRollup.objects.filter(period=period, bucket__gte=since)
+        .values('product_id').annotate(views=Sum('views')).order_by('-views')[:limit]
+    )
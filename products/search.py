@@ -0,0 +1,130 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Brand, Category, Product, Tag
+
+# Full-text product search on an SQLite FTS5 table keyed by product id
+# (rowid) with one column per searchable source: product name and
+# description, brand, category and tag names, and the SKU. The signal handlers in
+# ``products.signals`` re-index affected products inside the writing
+# transaction; ``rebuild_search_index`` rebuilds the whole table. Every query
+# word is a prefix match and all words must match; results are ranked with
+# bm25, weighting names above descriptions. Other database backends fall
+# back to icontains lookups.
+
+FTS_TABLE = 'products_product_fts'
+# bm25 column weights: name, description, brand, category, tags, sku
+WEIGHTS = (10.0, 1.0, 4.0, 3.0, 2.0, 10.0)
+BATCH_SIZE = 500
+WORD = re.compile(r'\w+', re.UNICODE)
+
+CREATE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, description, brand, category, tags, sku,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+)
+"""
+DROP_SQL = f'DROP TABLE IF EXISTS {FTS_TABLE}'
+
+SOURCE_SQL = f"""
+SELECT p.id, p.name, COALESCE(p.description, ''), COALESCE(b.name, ''), COALESCE(c.name, ''),
+       COALESCE((SELECT group_concat(t.name, ' ') FROM {Tag._meta.db_table} t WHERE t.product_id = p.id), ''),
+       COALESCE(p.sku, '')
+FROM {Product._meta.db_table} p
+LEFT JOIN {Brand._meta.db_table} b ON b.id = p.brand_id
+LEFT JOIN {Category._meta.db_table} c ON c.id = p.category_id
+"""
+INSERT_SQL = f'INSERT INTO {FTS_TABLE} (rowid, name, description, brand, category, tags, sku) '
+
+
+def enabled(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def match_expression(text):
+    # every word as a quoted prefix term; quoting keeps FTS syntax characters literal
+    words = WORD.findall(text or '')
+    return ' '.join(f'"{word}"*' for word in words) or None
+
+
+def reindex(product_ids):
+    if not enabled():
+        return
+    product_ids = list(product_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            batch = product_ids[start:start + BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+            cursor.execute(f'{INSERT_SQL}{SOURCE_SQL} WHERE p.id IN ({placeholders})', batch)
+
+
+def remove(product_ids):
+    if not enabled():
+        return
+    product_ids = list(product_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            batch = product_ids[start:start + BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+
+
+def rebuild(using=connection):
+    if not enabled(using):
+        return 0
+    with transaction.atomic(using=using.alias), using.cursor() as cursor:
+        cursor.execute(DROP_SQL)
+        cursor.execute(CREATE_SQL)
+        cursor.execute(f'{INSERT_SQL}{SOURCE_SQL}')
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def ranked_ids(text, limit=None, offset=0, active_only=False):
+    # product ids, best match first
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    if not enabled():
+        products = filter_products(Product.objects.filter(is_active=True) if active_only else Product.objects.all(), text)
+        ids = products.order_by('pk').values_list('pk', flat=True)
+        return list(ids[offset:] if limit is None else ids[offset:offset + limit])
+    weights = ', '.join(str(weight) for weight in WEIGHTS)
+    sql = f'SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE}'
+    if active_only:
+        sql += f' JOIN {Product._meta.db_table} p ON p.id = {FTS_TABLE}.rowid AND p.is_active'
+    sql += f' WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}, {weights}), {FTS_TABLE}.rowid'
+    params = [expression]
+    if limit is not None:
+        sql += ' LIMIT %s OFFSET %s'
+        params += [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_products(queryset, text):
+    # unordered: callers keep their own ordering (e.g. the admin changelist)
+    expression = match_expression(text)
+    if expression is None:
+        return queryset
+    if not enabled():
+        condition = Q()
+        for word in WORD.findall(text):
+            condition &= (
+                Q(name__icontains=word) | Q(description__icontains=word) | Q(brand__name__icontains=word)
+                | Q(category__name__icontains=word) | Q(tags__name__icontains=word) | Q(sku__icontains=word)
+            )
+        return queryset.filter(pk__in=Product.objects.filter(condition).values('pk'))
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]))
+
+
+def search(text, limit=20, offset=0, active_only=True, queryset=None):
+    ids = ranked_ids(text, limit, offset, active_only)
+    rows = (queryset if queryset is not None else Product.objects.all()).in_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
@@ -0,0 +1,97 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from beauty_salon_project import trending
+from beauty_salon_project.ratings import apply_rating, move_rating
+
+from . import category_tree, facets, search
+from .models import Brand, Category, Product, ProductReview, Tag, Wishlist
+
+# trending weights per event. Nothing in the shop records a sale yet
+# (reserve_stock is a cart hold), so sales_count is not a source.
+VIEW_WEIGHT = 1
+WISHLIST_WEIGHT = 3
+
+trending.register(Product, 'view_count', VIEW_WEIGHT)
+
+
+@receiver(post_save, sender=ProductReview)
+def apply_product_review(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        apply_rating(Product, instance.product_id, instance.score)
+    else:
+        previous = getattr(instance, '_loaded_score', None)
+        if previous is not None:
+            previous_target = getattr(instance, '_loaded_target', None) or instance.product_id
+            move_rating(Product, previous_target, instance.product_id, previous, instance.score)
+    instance._loaded_score = instance.score
+    instance._loaded_target = instance.product_id
+
+
+@receiver(post_delete, sender=ProductReview)
+def remove_product_review(sender, instance, **kwargs):
+    score = getattr(instance, '_loaded_score', None) or instance.score
+    target = getattr(instance, '_loaded_target', None) or instance.product_id
+    apply_rating(Product, target, -score, count=-1)
+
+
+@receiver(post_save, sender=Wishlist)
+def bump_trending_on_wishlist(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        trending.bump(Product, instance.product_id, WISHLIST_WEIGHT)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_trending_products(sender, instance, raw=False, **kwargs):
+    trending.invalidate(Product)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, instance, **kwargs):
+    category_tree.invalidate()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    search.reindex([instance.pk])
+    facets.record_change_on_commit([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove([instance.pk])
+    facets.record_change_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+def reindex_brand_products_on_save(sender, instance, created, raw=False, **kwargs):
+    if not created:
+        search.reindex(Product.objects.filter(brand=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    if not created:
+        search.reindex(Product.objects.filter(category=instance).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Brand)
+def remember_brand_products(sender, instance, **kwargs):
+    # the brand FK is SET_NULL by a plain UPDATE, which sends no signals
+    instance._product_ids = list(Product.objects.filter(brand=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Brand)
+def reindex_brand_products(sender, instance, **kwargs):
+    search.reindex(getattr(instance, '_product_ids', []))
+    facets.record_change_on_commit(getattr(instance, '_product_ids', []))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reindex_tagged_product(sender, instance, raw=False, **kwargs):
+    search.reindex([instance.product_id])
@@ -1,3 +1,679 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from beauty_salon_project import counters, trending
+from beauty_salon_project.counters import MAX_MISSES, CounterBuffer
+from beauty_salon_project.testing import ChangelistQueryBudgetMixin, bulk_users
+from . import category_tree, facets, listing, search, tracking
+from .rollups import CHECKPOINT, most_viewed, purge_raw_views, rollup_views
+from .inventory import InsufficientStock, alerts_since, release_stock, reserve_stock
+from .models import (
+    Brand, Category, Product, ProductReview, ProductVariant, ProductView, ProductViewRollup, RollupCheckpoint,
+    StockAlert, Tag, Wishlist,
+)
+
+
+class AdminQueryBudgetTests(ChangelistQueryBudgetMixin, TestCase):
+    ROWS = 1200
+
+    @classmethod
+    def setUpTestData(cls):
+        brands = Brand.objects.bulk_create([Brand(name=f'brand{i}', slug=f'brand{i}') for i in range(cls.ROWS)])
+        roots = [Category.objects.create(name=f'root{i}', slug=f'root{i}') for i in range(5)]
+        categories = Category.objects.bulk_create([
+            Category(name=f'category{i}', slug=f'category{i}', parent=roots[i % 5]) for i in range(cls.ROWS)
+        ])
+        products = Product.objects.bulk_create([
+            Product(name=f'product{i}', slug=f'product{i}', sku=f'sku{i}', price=100,
+                    category=categories[i % 50], brand=brands[i % 50])
+            for i in range(cls.ROWS)
+        ])
+        users = bulk_users('shopper', 50)
+        Tag.objects.bulk_create([
+            Tag(name=f'tag{i}', slug=f'tag{i}', product=products[i]) for i in range(cls.ROWS)
+        ])
+        Wishlist.objects.bulk_create([
+            Wishlist(user=users[i % 50], product=products[i]) for i in range(cls.ROWS)
+        ])
+        ProductView.objects.bulk_create([
+            ProductView(product=products[i], user=users[i % 50] if i % 2 else None, ip_address='127.0.0.1')
+            for i in range(cls.ROWS)
+        ])
+        StockAlert.objects.bulk_create([
+            StockAlert(product=products[i], previous_state='in_stock', state='low', stock=3) for i in range(cls.ROWS)
+        ])
+
+    def test_brand_changelist(self):
+        self.assertChangelistQueries(Brand, 6)
+
+    def test_category_changelist(self):
+        # a warm tree costs one version read per request instead of the build
+        category_tree.get_tree()
+        self.assertChangelistQueries(Category, 7)
+
+    def test_product_changelist(self):
+        self.assertChangelistQueries(Product, 7)
+
+    def test_tag_changelist(self):
+        self.assertChangelistQueries(Tag, 5)
+
+    def test_wishlist_changelist(self):
+        self.assertChangelistQueries(Wishlist, 5)
+
+    def test_product_view_changelist(self):
+        self.assertChangelistQueries(ProductView, 7)
+
+    def test_stock_alert_changelist(self):
+        self.assertChangelistQueries(StockAlert, 7)
+
+
+class FacetJournalTests(TestCase):
+
+    def test_duplicate_sequence_starts_a_new_epoch(self):
+        facets.record_change([1])
+        epoch, sequence = facets.journal_state()
+        # a second writer that read the same sequence before either incremented
+        cache.set(facets.SEQUENCE_KEY, sequence - 1, None)
+        facets.record_change([2])
+
+        self.assertNotEqual(facets.journal_state()[0], epoch)
+        self.assertEqual(cache.get(facets.CHANGE_KEY.format(epoch, sequence)), [1])
+
+
+class CategoryTreeTests(TestCase):
+
+    def setUp(self):
+        self.skin = Category.objects.create(name='skin', slug='skin', order=2)
+        self.hair = Category.objects.create(name='hair', slug='hair', order=1)
+        self.gifts = Category.objects.create(name='gifts', slug='gifts')
+        self.serum = Category.objects.create(name='serum', slug='serum', parent=self.skin)
+        self.cream = Category.objects.create(name='cream', slug='cream', parent=self.skin, order=1,
+                                             is_active=False)
+        self.night = Category.objects.create(name='night', slug='night', parent=self.cream)
+        self.shampoo = Category.objects.create(name='shampoo', slug='shampoo', parent=self.hair)
+
+    def test_build_is_one_query(self):
+        with self.assertNumQueries(1):
+            tree = category_tree.build()
+
+        self.assertEqual(tree.root_ids, (self.hair.pk, self.skin.pk, self.gifts.pk))
+        self.assertEqual(tree.get(self.skin.pk).child_ids, (self.cream.pk, self.serum.pk))
+        self.assertEqual(tree.label(self.night.pk), 'cream > night')
+        self.assertEqual(tree.breadcrumb(self.night.pk), 'skin > cream > night')
+        self.assertEqual(tree.by_slug['night'].ancestor_ids, (self.skin.pk, self.cream.pk))
+        by_path = Category.objects.filter(path__startswith=self.skin.path).exclude(pk=self.skin.pk).order_by('path')
+        self.assertEqual(tree.get(self.skin.pk).descendant_ids, tuple(by_path.values_list('pk', flat=True)))
+
+    def test_inactive_ancestors_hide_their_subtree(self):
+        tree = category_tree.build()
+        self.assertFalse(tree.get(self.night.pk).visible)
+        self.assertTrue(tree.get(self.night.pk).is_active)
+        self.assertEqual(tree.subtree_ids(self.skin.pk, visible_only=True), (self.skin.pk, self.serum.pk))
+        self.assertEqual(
+            [(node.slug, [child.slug for child, _ in children]) for node, children in tree.menu()],
+            [('hair', ['shampoo']), ('skin', ['serum']), ('gifts', [])],
+        )
+
+    def test_choices_are_in_tree_order(self):
+        self.assertEqual(category_tree.build().choices(), [
+            (self.hair.pk, 'hair'), (self.shampoo.pk, 'hair > shampoo'), (self.skin.pk, 'skin'),
+            (self.cream.pk, 'skin > cream'), (self.night.pk, 'cream > night'), (self.serum.pk, 'skin > serum'),
+            (self.gifts.pk, 'gifts'),
+        ])
+
+    def test_saves_and_deletes_invalidate_the_snapshot(self):
+        tree = category_tree.get_tree()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIs(category_tree.get_tree(), tree)
+        self.assertFalse([query for query in queries if 'products_category' in query['sql']])
+
+        self.serum.name = 'serums'
+        self.serum.save()
+        self.assertEqual(category_tree.get_tree().label(self.serum.pk), 'skin > serums')
+        self.shampoo.delete()
+        self.assertNotIn(self.shampoo.pk, category_tree.get_tree())
+        self.assertEqual(category_tree.get_tree().get(self.hair.pk).child_ids, ())
+
+
+class CategoryPathTests(TestCase):
+
+    def setUp(self):
+        self.face = Category.objects.create(name='face', slug='face')
+        self.body = Category.objects.create(name='body', slug='body')
+        self.cream = Category.objects.create(name='cream', slug='cream', parent=self.face)
+        self.night = Category.objects.create(name='night', slug='night', parent=self.cream)
+
+    def tree(self):
+        return dict(Category.objects.values_list('slug', 'path'))
+
+    def test_moving_a_category_moves_its_subtree(self):
+        product = Product.objects.create(name='balm', slug='balm', sku='balm', price=10, category=self.night)
+        self.cream.parent = self.body
+        self.cream.save()
+
+        body, cream, night = self.body.pk, self.cream.pk, self.night.pk
+        self.assertEqual(self.tree()['night'], f'{body}/{cream}/{night}/')
+        self.assertEqual(Category.objects.get(pk=night).depth, 2)
+        self.assertEqual(list(self.body.get_products()), [product])
+        self.assertFalse(self.face.get_products().exists())
+
+        self.cream.parent = None
+        self.cream.save()
+        self.assertEqual(self.tree()['night'], f'{cream}/{night}/')
+        self.assertEqual(list(Category.objects.filter(slug__in=['cream', 'night']).values_list('depth', flat=True)
+                              .order_by('depth')), [0, 1])
+
+    def test_cannot_move_under_its_own_subtree(self):
+        self.face.parent = self.night
+        with self.assertRaises(ValidationError):
+            self.face.clean()
+        with self.assertRaises(ValueError):
+            self.face.save()
+        self.assertEqual(self.tree()['face'], f'{self.face.pk}/')
+
+
+class ProductListingTests(TestCase):
+
+    def setUp(self):
+        Product.objects.bulk_create([
+            Product(name=f'product{i}', slug=f'product{i}', sku=f'sku{i}', price=10 * (i % 3), is_active=i != 4)
+            for i in range(7)
+        ])
+
+    def cursor(self, *data):
+        return base64.urlsafe_b64encode(json.dumps(list(data)).encode()).decode()
+
+    def test_pages_walk_every_active_product_once(self):
+        for sort in listing.SORTS:
+            seen, cursor = [], None
+            while True:
+                response = self.client.get(reverse('products:product_list'),
+                                           {'sort': sort, 'limit': 2, **({'cursor': cursor} if cursor else {})})
+                seen += [row['slug'] for row in response.json()['results']]
+                cursor = response.json()['next_cursor']
+                if cursor is None:
+                    break
+            expected = listing.order(Product.objects.filter(is_active=True), sort).values_list('slug', flat=True)
+            self.assertEqual(seen, list(expected), sort)
+
+    def test_tampered_cursors_are_rejected(self):
+        for sort, cursor in [
+            ('price', self.cursor('price', 'abc', 1)),
+            ('price', self.cursor('price', 'NaN', 1)),
+            ('price', self.cursor('price', 'Infinity', 1)),
+            ('price', self.cursor('price', [1], 1)),
+            ('newest', self.cursor('newest', 'abc', 1)),
+            ('newest', self.cursor('newest', 5, 1)),
+            ('newest', self.cursor('price', '10', 1)),
+            ('newest', 'not base64!'),
+        ]:
+            response = self.client.get(reverse('products:product_list'), {'sort': sort, 'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+
+    def test_non_finite_prices_are_rejected(self):
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf', 'abc'):
+            response = self.client.get(reverse('products:product_list'), {'min_price': value})
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_pages_are_read_in_index_order(self):
+        after = Product.objects.filter(is_active=True).first()
+        for sort in listing.SORTS:
+            with CaptureQueriesContext(connection) as queries:
+                listing.product_page(sort, listing.encode_cursor(sort, after), limit=2)
+            page_sql = queries.captured_queries[0]['sql']
+            plan = '\n'.join(row[-1] for row in connection.cursor().execute(f'EXPLAIN QUERY PLAN {page_sql}'))
+            self.assertIn('USING INDEX product_', plan, sort)
+            self.assertNotIn('TEMP B-TREE', plan, sort)
+
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        self.brand = Brand.objects.create(name='Lumiere', slug='lumiere')
+        self.category = Category.objects.create(name='Serums', slug='serums')
+        self.glow = Product.objects.create(name='Glow drops', slug='glow', sku='LM-1001', price=10,
+                                           description='vitamin serum', brand=self.brand)
+        self.vitamin = Product.objects.create(name='Vitamin cream', slug='vitamin', sku='LM-2002', price=10,
+                                              category=self.category)
+
+    def ids(self, text, **kwargs):
+        return search.ranked_ids(text, **kwargs)
+
+    def test_saving_reindexes_and_names_rank_first(self):
+        self.assertEqual(self.ids('vitamin'), [self.vitamin.pk, self.glow.pk])
+        self.assertEqual(self.ids('vit glo'), [self.glow.pk])
+
+        self.glow.name = 'Radiance drops'
+        self.glow.save()
+        self.assertEqual(self.ids('glow'), [])
+        self.assertEqual(self.ids('radiance'), [self.glow.pk])
+
+        Product.objects.filter(pk=self.vitamin.pk).update(is_active=False)
+        self.assertEqual(self.ids('vitamin', active_only=True), [self.glow.pk])
+
+    def test_brand_category_and_tag_changes_reindex_their_products(self):
+        self.brand.name = 'Aurora'
+        self.brand.save()
+        self.category.name = 'Creams'
+        self.category.save()
+        Tag.objects.create(name='hydrating', slug='hydrating', product=self.glow)
+        self.assertEqual(self.ids('aurora'), [self.glow.pk])
+        self.assertEqual(self.ids('creams'), [self.vitamin.pk])
+        self.assertEqual(self.ids('hydrat'), [self.glow.pk])
+
+        self.brand.delete()
+        Tag.objects.all().delete()
+        self.assertEqual(self.ids('aurora'), [])
+        self.assertEqual(self.ids('hydrating'), [])
+
+    def test_admin_searches_by_sku(self):
+        admin_user = bulk_users('admin', 1, is_staff=True, is_superuser=True)[0]
+        self.client.force_login(admin_user)
+        url = reverse('admin:products_product_changelist')
+        for term, expected in (('LM-2002', 1), ('lm-2002', 1), ('vitamin cream', 1), ('LM', 2)):
+            response = self.client.get(url, {'q': term})
+            self.assertEqual(response.context['cl'].result_count, expected, term)
+
+    def test_deleting_removes_from_the_index(self):
+        self.vitamin.delete()
+        self.assertEqual(self.ids('vitamin'), [self.glow.pk])
+        self.assertEqual(search.rebuild(), 1)
+        # FTS syntax in the query is matched literally
+        self.assertEqual(self.ids('"drops" -'), [self.glow.pk])
+
+
+class FacetCountTests(TestCase):
+
+    def setUp(self):
+        brands = [Brand.objects.create(name=name, slug=name) for name in ('lumiere', 'aurora')]
+        Product.objects.bulk_create([
+            Product(name=f'product{i}', slug=f'product{i}', sku=f'sku{i}', price=10 * i,
+                    brand=brands[i % 2], is_available=i % 3 != 0)
+            for i in range(9)
+        ])
+        self.brand = brands[0]
+        cache.clear()
+
+    def test_totals_match_the_listing(self):
+        for params in ({}, {'available': '1'}, {'available': '0'}, {'available': '0', 'brand': self.brand.pk},
+                       {'available': '1', 'min_price': '20', 'max_price': '60'}):
+            listed = self.client.get(reverse('products:product_list'), {**params, 'limit': 100}).json()['results']
+            counts = self.client.get(reverse('products:product_facets'), params).json()
+            self.assertEqual(counts['total'], len(listed), params)
+            # the other brand's count ignores the brand selection but keeps availability
+            if 'brand' in params:
+                others = self.client.get(reverse('products:product_list'), {'available': '0', 'limit': 100})
+                self.assertEqual(sum(counts['brand'].values()), len(others.json()['results']))
+
+
+    def test_warm_request_reads_only_the_version_keys(self):
+        url = reverse('products:product_facets')
+        self.client.get(url, {'available': '1'})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, {'available': '1'}).status_code, 200)
+        # the category tree version and one get_many of the journal state
+        self.assertEqual(len(queries), 2, '\n'.join(query['sql'] for query in queries))
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+
+    def test_non_finite_prices_are_rejected(self):
+        for value in ('NaN', 'sNaN', 'Infinity'):
+            response = self.client.get(reverse('products:product_facets'), {'min_price': value})
+            self.assertEqual(response.status_code, 400, value)
+
+
+class ProductDetailTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='toner', slug='toner', sku='toner', price=30, stock=4)
+        self.pipeline = tracking.ViewPipeline()
+        self.pipeline._ensure_thread = lambda: None
+        patcher = mock.patch.object(tracking, 'pipeline', self.pipeline)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(counters.flush)
+
+    def test_detail_records_one_view_per_visitor(self):
+        url = reverse('products:product_detail', args=['toner'])
+        response = self.client.get(url)
+        self.client.get(url)
+        self.client.get(url, REMOTE_ADDR='10.0.0.2')
+
+        self.assertEqual(response.json()['stock_state'], 'low')
+        self.assertEqual(self.pipeline.flush(), 2)
+        self.assertEqual(sorted(ProductView.objects.values_list('ip_address', flat=True)),
+                         ['10.0.0.2', '127.0.0.1'])
+
+    def test_inactive_products_are_not_found(self):
+        Product.objects.filter(pk=self.product.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('products:product_detail', args=['toner'])).status_code, 404)
+        self.assertEqual(self.pipeline.flush(), 0)
+
+
+class ViewRollupTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='mask', slug='mask', sku='mask', price=20)
+        self.hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+
+    def add_views(self, count, created_at):
+        views = ProductView.objects.bulk_create([
+            ProductView(product=self.product, ip_address='127.0.0.1') for _ in range(count)
+        ])
+        ProductView.objects.filter(pk__in=[view.pk for view in views]).update(created_at=created_at)
+
+    def rollups(self, period):
+        return dict(ProductViewRollup.objects.filter(period=period).values_list('bucket', 'views'))
+
+    def test_rollup_merges_into_hourly_and_daily_rows(self):
+        self.add_views(3, self.hour + timedelta(minutes=5))
+        self.assertEqual(rollup_views(batch_size=2), 3)
+        self.add_views(1, timezone.now())
+        self.assertEqual(rollup_views(), 0)  # not settled yet
+        ProductView.objects.filter(created_at__gt=self.hour + timedelta(hours=1)).delete()
+
+        self.add_views(2, self.hour + timedelta(minutes=50))
+        self.assertEqual(rollup_views(), 2)
+        self.assertEqual(self.rollups('hour'), {self.hour: 5})
+        self.assertEqual(sum(self.rollups('day').values()), 5)
+        self.assertEqual(most_viewed(), [{'product_id': self.product.pk, 'views': 5}])
+
+    def test_overlapping_run_does_not_count_twice(self):
+        self.add_views(3, self.hour)
+        stale = RollupCheckpoint.objects.create(name=CHECKPOINT)
+        rollup_views()
+        # a second run that read the checkpoint before the first one moved it
+        with mock.patch.object(RollupCheckpoint.objects, 'get_or_create', return_value=(stale, False)):
+            self.assertEqual(rollup_views(), 0)
+        self.assertEqual(self.rollups('hour'), {self.hour: 3})
+
+    def test_purge_keeps_rows_not_rolled_up(self):
+        self.add_views(2, timezone.now() - timedelta(days=40))
+        rollup_views()
+        self.add_views(1, timezone.now() - timedelta(days=40))
+
+        self.assertEqual(purge_raw_views(30), 2)
+        self.assertEqual(ProductView.objects.count(), 1)
+
+
+class ProductRatingTests(TestCase):
+
+    def test_moved_review_and_recompute(self):
+        first, second = Product.objects.bulk_create([
+            Product(name=f'oil{i}', slug=f'oil{i}', sku=f'oil{i}', price=15) for i in range(2)
+        ])
+        Product.objects.filter(pk=first.pk).update(baseline_rating_sum=8, baseline_rating_count=2,
+                                                   rating_sum=8, rating_count=2)
+        user = bulk_users('reviewer', 1)[0]
+        review = ProductReview.objects.create(product=first, user=user, score=5)
+        review = ProductReview.objects.get(pk=review.pk)
+        review.product = second
+        review.save()
+
+        totals = dict(Product.objects.values_list('pk', 'rating_sum'))
+        self.assertEqual((totals[first.pk], totals[second.pk]), (8, 5))
+        Product.objects.update(rating_sum=0, rating_count=0)
+        call_command('recompute_product_ratings', stdout=StringIO())
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('rating_sum', 'rating_count', 'rating')),
+            [(8, 2, 4), (5, 1, 5)],
+        )
+
+
+class CounterBufferTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='cream', slug='cream', sku='cream', price=10)
+        self.buffer = CounterBuffer(flush_interval=0)
+        # flushes are driven by the test, not by the background thread
+        self.buffer._ensure_thread = lambda: None
+
+    def views(self):
+        return Product.objects.values_list('view_count', flat=True).get(pk=self.product.pk)
+
+    def test_overdue_flush_waits_for_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.buffer.incr(Product, self.product.pk, 'view_count')
+                self.assertEqual(self.views(), 0)
+        self.assertEqual(self.views(), 1)
+
+    def test_rollback_keeps_pending_increments(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.buffer.incr(Product, self.product.pk, 'view_count', 2)
+                raise RuntimeError
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.views(), 2)
+
+    def test_invisible_rows_are_requeued(self):
+        pk = self.product.pk + 1
+        self.buffer.incr(Product, pk, 'view_count', 3)
+        self.assertEqual(self.buffer.flush(), 0)
+        Product.objects.create(pk=pk, name='late', slug='late', sku='late', price=10)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Product.objects.get(pk=pk).view_count, 3)
+
+    def test_deleted_rows_are_eventually_dropped(self):
+        self.buffer.incr(Product, self.product.pk + 1, 'view_count')
+        with self.assertLogs('beauty_salon_project.counters', 'WARNING'):
+            for _ in range(MAX_MISSES + 1):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertFalse(self.buffer._pending)
+
+
+class TrendingTests(TestCase):
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name=name, slug=name, sku=name, price=10) for name in ('cream', 'serum', 'oil')
+        ]
+        self.addCleanup(counters.flush)
+
+    def score(self, product):
+        return Product.objects.values_list('trend_score', flat=True).get(pk=product.pk)
+
+    def test_growth_doubles_every_half_life(self):
+        moment = trending.EPOCH + timedelta(hours=trending.half_life_hours())
+        self.assertAlmostEqual(trending.growth(moment), 2.0)
+        later = moment + timedelta(hours=trending.half_life_hours())
+        self.assertAlmostEqual(trending.decayed(trending.growth(moment), later), 0.5)
+
+    def test_counter_flush_and_bump_add_weighted_scores(self):
+        cream, serum, oil = self.products
+        counters.increment(Product, cream.pk, 'view_count', 4)
+        Wishlist.objects.create(user=bulk_users('shopper', 1)[0], product=serum)
+        counters.flush()
+        self.assertAlmostEqual(trending.decayed(self.score(cream)), 4, places=3)
+        self.assertAlmostEqual(trending.decayed(self.score(serum)), 3, places=3)
+
+        # an older event counts for less than the same event today
+        trending.bump(Product, oil.pk, 8, moment=timezone.now() - timedelta(hours=2 * trending.half_life_hours()))
+        counters.flush()
+        self.assertAlmostEqual(trending.decayed(self.score(oil)), 2, places=3)
+
+    def test_top_ids_are_cached_until_a_product_changes(self):
+        cream, serum, oil = self.products
+        Product.objects.filter(pk=cream.pk).update(trend_score=3)
+        Product.objects.filter(pk=serum.pk).update(trend_score=5)
+        Product.objects.filter(pk=oil.pk).update(trend_score=9, is_active=False)
+        self.assertEqual(trending.top_ids(Product), [serum.pk, cream.pk])
+
+        Product.objects.filter(pk=cream.pk).update(trend_score=7)
+        self.assertEqual(trending.top_ids(Product), [serum.pk, cream.pk])
+        cream.refresh_from_db()
+        cream.save()
+        self.assertEqual(trending.top_ids(Product, k=1), [cream.pk])
+        self.assertEqual(trending.top_ids(Product), [cream.pk, serum.pk])
+
+    def test_top_query_reads_the_partial_index(self):
+        rows = Product.objects.filter(is_active=True, trend_score__gt=0).order_by('-trend_score')
+        for queryset in (rows, rows.filter(category_id=1)):
+            plan = queryset.values_list('pk', flat=True)[:10].explain()
+            self.assertIn('trending_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class InventoryTests(TestCase):
+
+    def setUp(self):
+        self.products = Product.objects.bulk_create([
+            Product(name=f'product{i}', slug=f'product{i}', sku=f'sku{i}', price=100, stock=5) for i in range(3)
+        ])
+        self.variant = ProductVariant.objects.create(product=self.products[0], name='red', sku='red',
+                                                     color_code='#ff0000', stock=2)
+
+    def stock(self):
+        return [product.stock for product in Product.objects.order_by('pk')]
+
+    def test_whole_cart_is_reserved(self):
+        cart = [(self.products[0], 2), (self.products[1], 2), (self.products[2], 5), (self.variant, 2)]
+        result = reserve_stock(cart)
+
+        self.assertEqual(result.failed, [])
+        self.assertEqual(self.stock(), [3, 3, 0])
+        self.assertEqual(self.products[2].stock, 0)
+        self.assertFalse(self.products[2].is_in_stock())
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 0)
+
+    def test_shortage_rolls_back_the_cart(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock([(self.products[0], 2), (self.products[1], 6), (self.variant, 3)])
+
+        self.assertEqual([(s.pk, s.requested, s.available) for s in raised.exception.failed],
+                         [(self.products[1].pk, 6, 5), (self.variant.pk, 3, 2)])
+        self.assertEqual(self.stock(), [5, 5, 5])
+
+    def test_partial_reservation_reports_failures(self):
+        result = reserve_stock([(self.products[0], 4), (self.products[1], 4), (self.products[2], 9)],
+                               allow_partial=True)
+
+        self.assertEqual([shortage.pk for shortage in result.failed], [self.products[2].pk])
+        self.assertEqual(self.stock(), [1, 1, 5])
+
+    def test_release_puts_stock_back(self):
+        reserve_stock([(self.products[0], 3)])
+        release_stock([(self.products[0], 3)])
+        self.assertEqual(self.stock(), [5, 5, 5])
+
+    def test_batched_update_finds_the_short_line(self):
+        Product.objects.filter(pk=self.products[1].pk).update(stock=1)
+        result = reserve_stock([(product, 2) for product in self.products], allow_partial=True)
+
+        self.assertEqual([shortage.pk for shortage in result.failed], [self.products[1].pk])
+        self.assertEqual(self.stock(), [3, 1, 3])
+
+
+class StockStateTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='serum', slug='serum', sku='serum', price=100,
+                                              stock=12, low_stock_threshold=10)
+
+    def transitions(self):
+        return list(StockAlert.objects.order_by('pk').values_list('previous_state', 'state', 'stock'))
+
+    def test_save_maintains_state_and_alerts_on_transitions_only(self):
+        self.assertEqual(self.product.stock_state, 'in_stock')
+        self.product.stock = 11
+        self.product.save()
+        self.product.stock = 4
+        self.product.save(update_fields=['stock'])
+        self.product.stock = 0
+        self.product.save()
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_state, 'out')
+        self.assertEqual(self.transitions(), [('in_stock', 'low', 4), ('low', 'out', 0)])
+
+    def test_saves_that_cannot_change_stock_skip_the_state_read(self):
+        self.product.name = 'night serum'
+        with CaptureQueriesContext(connection) as queries:
+            self.product.save(update_fields=['name'])
+            Product.objects.create(name='new', slug='new', sku='new', price=1)
+        reads = [query['sql'] for query in queries if query['sql'].startswith('SELECT "products_product"."stock_state"')]
+        self.assertEqual(reads, [])
+
+    def test_scan_only_repairs_when_asked(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=2)
+        out = StringIO()
+        call_command('scan_stock', stdout=out)
+
+        self.assertNotIn('Repaired', out.getvalue())
+        self.assertTrue(Product.objects.stale_stock_state().exists())
+
+    def test_reservation_crossing_threshold_alerts(self):
+        reserve_stock([(self.product, 1)])
+        self.assertEqual(self.transitions(), [])
+        reserve_stock([(self.product, 3)])
+        release_stock([(self.product, 4)])
+
+        self.assertEqual(self.transitions(), [('in_stock', 'low', 8), ('low', 'in_stock', 12)])
+
+    def test_queryset_filters(self):
+        low = Product.objects.create(name='low', slug='low', sku='low', price=1, stock=3)
+        out = Product.objects.create(name='out', slug='out', sku='out', price=1, stock=None)
+
+        self.assertEqual(list(Product.objects.low_stock()), [low])
+        self.assertEqual(list(Product.objects.out_of_stock()), [out])
+        self.assertEqual(set(Product.objects.needs_restock()), {low, out})
+
+    def test_scan_repairs_raw_updates_and_advances_feed(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=2)
+        self.assertEqual(list(Product.objects.stale_stock_state()), [self.product])
+
+        call_command('scan_stock', repair=True, alerts=True, stdout=StringIO())
+
+        self.assertFalse(Product.objects.stale_stock_state().exists())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_state, 'low')
+        self.assertEqual(self.transitions(), [('in_stock', 'low', 2)])
+        checkpoint = RollupCheckpoint.objects.get(name='stock-alerts')
+        self.assertEqual(alerts_since(checkpoint.last_id), [])
+
+
+class ConcurrentStockTests(TransactionTestCase):
+
+    def test_flash_sale_never_oversells(self):
+        product = Product.objects.create(name='flash', slug='flash', sku='flash', price=100, stock=7)
+        other = Product.objects.create(name='other', slug='other', sku='other', price=100, stock=100)
+        workers = 24
+        barrier = threading.Barrier(workers)
+        reserved, sold_out = [], []
+
+        def buy(index):
+            barrier.wait()
+            try:
+                reserve_stock([(Product(pk=product.pk), 1), (Product(pk=other.pk), 1 + index % 2)])
+                reserved.append(index)
+            except InsufficientStock:
+                sold_out.append(index)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(index,)) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(len(reserved), 7)
+        self.assertEqual(len(sold_out), workers - 7)
+        self.assertEqual(product.stock, 0)
+        # the rolled-back carts did not keep their other line either
+        self.assertEqual(other.stock, 100 - sum(1 + index % 2 for index in reserved))
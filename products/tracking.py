@@ -0,0 +1,121 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from beauty_salon_project import counters
+
+from .models import Product, ProductView
+
+logger = logging.getLogger(__name__)
+
+# Product page views are queued in memory and written by a background thread
+# with bulk_create, so requests never wait on an INSERT. Repeat views of the
+# same product from the same visitor (session key, or IP address when there
+# is no session) within the dedupe window are dropped before queueing.
+
+DEFAULTS = {
+    'PRODUCT_VIEW_BATCH_SIZE': 500,
+    'PRODUCT_VIEW_FLUSH_INTERVAL': 2,
+    'PRODUCT_VIEW_DEDUPE_SECONDS': 30 * 60,
+    'PRODUCT_VIEW_QUEUE_SIZE': 50000,
+}
+
+
+def setting(name):
+    return getattr(settings, name, DEFAULTS[name])
+
+
+class ViewPipeline:
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=setting('PRODUCT_VIEW_QUEUE_SIZE'))
+        self._seen = {}
+        self._seen_lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        self._write_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, product_id, ip_address, session_key='', user_id=None):
+        now = time.monotonic()
+        key = (product_id, session_key or ip_address)
+        window = setting('PRODUCT_VIEW_DEDUPE_SECONDS')
+        with self._seen_lock:
+            last = self._seen.get(key)
+            if last is not None and now - last < window:
+                return False
+            self._seen[key] = now
+            if now - self._last_prune > window:
+                self._seen = {k: seen for k, seen in self._seen.items() if now - seen < window}
+                self._last_prune = now
+
+        try:
+            self._queue.put_nowait(ProductView(
+                product_id=product_id, user_id=user_id,
+                ip_address=ip_address, session_key=session_key,
+            ))
+        except queue.Full:
+            logger.warning('product view queue is full; dropping view of product %s', product_id)
+            return False
+        self._ensure_thread()
+        return True
+
+    def drain(self, limit=None):
+        views = []
+        limit = limit or setting('PRODUCT_VIEW_BATCH_SIZE')
+        while len(views) < limit:
+            try:
+                views.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return views
+
+    def write(self, views):
+        if not views:
+            return 0
+        with self._write_lock:
+            ProductView.objects.bulk_create(views, batch_size=setting('PRODUCT_VIEW_BATCH_SIZE'))
+        for view in views:
+            counters.increment(Product, view.product_id, 'view_count')
+        return len(views)
+
+    def flush(self):
+        written = 0
+        while True:
+            views = self.drain()
+            if not views:
+                return written
+            written += self.write(views)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='product-views', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(setting('PRODUCT_VIEW_FLUSH_INTERVAL'))
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('writing product views failed')
+            finally:
+                close_old_connections()
+
+
+pipeline = ViewPipeline()
+atexit.register(pipeline.flush)
+
+
+def record_view(request, product):
+    user_id = request.user.pk if request.user.is_authenticated else None
+    return pipeline.record(product.pk, request.META.get('REMOTE_ADDR') or '0.0.0.0',
+                           request.session.session_key or '', user_id)
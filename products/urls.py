@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'products'
+
+urlpatterns = [
+    path('', views.product_list, name='product_list'),
+    path('search/', views.product_search, name='product_search'),
+    path('facets/', views.product_facets, name='product_facets'),
+    path('<slug:slug>/', views.product_detail, name='product_detail'),
+]
@@ -1,3 +1,147 @@
-from django.shortcuts import render
+from decimal import Decimal, InvalidOperation
 
-# Create your views here.
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from . import facets, search
+from .category_tree import get_tree
+from .listing import DEFAULT_PAGE_SIZE, DEFAULT_SORT, MAX_PAGE_SIZE, SORTS, first_images, product_page
+from .models import Product
+from .tracking import record_view
+
+SKIN_TYPES = {value for value, _ in Product.SKIN_TYPE_CHOICES}
+MULTI_CHOICES = {
+    'ingredients': {value for value, _ in Product.Ingredient_Choices},
+    'features': {value for value, _ in Product.Feature_Choices},
+    'how_to_use': {value for value, _ in Product.HowToUse_Choices},
+}
+
+
+def product_payload(product, tree):
+    images = getattr(product, 'first_images', [])
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'slug': product.slug,
+        'price': str(product.price),
+        'final_price': str(product.get_final_price()),
+        'discount_percentage': product.get_discount_percentage(),
+        'brand': product.brand and {'id': product.brand.pk, 'name': product.brand.name},
+        'category': product.category and {
+            'id': product.category.pk,
+            'name': product.category.name,
+            'breadcrumb': tree.breadcrumb(product.category_id),
+        },
+        'image': images[0].alt_text if images else None,
+        'suitable_for_skin': product.suitable_for_skin,
+        'is_available': product.is_available,
+        'rating': str(product.rating) if product.rating is not None else None,
+        'sales_count': product.sales_count,
+        'created_at': product.created_at.isoformat(),
+    }
+
+
+def parse_filters(params, tree):
+    filters = {'is_active': params.get('active', '1') != '0'}
+    if params.get('available'):
+        filters['is_available'] = params['available'] != '0'
+    category = params.get('category')
+    if category:
+        node = tree.by_slug.get(category) or (tree.get(int(category)) if category.isdigit() else None)
+        if node is None:
+            raise ValueError(f'unknown category {category!r}')
+        filters['category'] = node.id
+    if params.getlist('brand'):
+        filters['brands'] = [int(brand) for brand in params.getlist('brand')]
+    skin = params.get('skin')
+    if skin:
+        if skin not in SKIN_TYPES:
+            raise ValueError(f'unknown skin type {skin!r}')
+        filters['skin'] = skin
+    for name, choices in MULTI_CHOICES.items():
+        values = params.getlist(name)
+        if set(values) - choices:
+            raise ValueError(f'unknown {name} {sorted(set(values) - choices)!r}')
+        if values:
+            filters[name] = values
+    for name in ('min_price', 'max_price'):
+        if params.get(name):
+            try:
+                filters[name] = Decimal(params[name])
+            except InvalidOperation:
+                raise ValueError(f'{name} must be a number')
+            if not filters[name].is_finite():
+                raise ValueError(f'{name} must be a finite number')
+    return filters
+
+
+@require_GET
+def product_list(request):
+    params = request.GET
+    sort = params.get('sort', DEFAULT_SORT)
+    if sort not in SORTS:
+        return HttpResponseBadRequest(f"sort must be one of {', '.join(SORTS)}")
+    tree = get_tree()
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        filters = parse_filters(params, tree)
+        page = product_page(sort, params.get('cursor'), limit, **filters)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    return JsonResponse({
+        'results': [product_payload(product, tree) for product in page.products],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@require_GET
+def product_detail(request, slug):
+    product = get_object_or_404(
+        Product.objects.select_related('brand', 'category').prefetch_related(first_images()),
+        slug=slug, is_active=True,
+    )
+    record_view(request, product)
+    payload = product_payload(product, get_tree())
+    payload.update(description=product.description, stock_state=product.stock_state)
+    return JsonResponse(payload)
+
+
+@require_GET
+def product_search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    tree = get_tree()
+    products = search.search(query, limit, offset, queryset=Product.objects.select_related('brand', 'category').prefetch_related(first_images()))
+    return JsonResponse({
+        'query': query,
+        'results': [product_payload(product, tree) for product in products],
+    })
+
+
+@require_GET
+def product_facets(request):
+    # counts for the filter sidebar under the same parameters as product_list
+    tree = get_tree()
+    try:
+        filters = parse_filters(request.GET, tree)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    selections = {
+        'brand': filters.get('brands', []),
+        'category': [filters['category']] if 'category' in filters else [],
+        'skin': [filters['skin']] if 'skin' in filters else [],
+        'ingredients': filters.get('ingredients', []),
+        'features': filters.get('features', []),
+        'how_to_use': filters.get('how_to_use', []),
+    }
+    counts = facets.facet_counts(selections, filters.get('is_available'),
+                                 filters.get('min_price'), filters.get('max_price'), tree)
+    return JsonResponse({
+        facet: {str(value): count for value, count in values.items()} if isinstance(values, dict) else values
+        for facet, values in counts.items()
+    })
@@ -24,37 +24,47 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+@admin.register(CustomerProfile)
+class CustomerProfileAdmin(admin.ModelAdmin):
+    list_display = ['user','skin_type','hair_type','hair_length','hair_color',
+                    'total_reservations','last_reservation_date','created_at',]
+    list_filter = ['skin_type','hair_type','hair_length','hair_color','is_vip',]
+    search_fields = ['user__username','user__email','user__first_name','user__last_name',]
+    list_select_related = ['user']
+    readonly_fields = ['total_reservations', 'last_reservation_date',
+                       'created_at', 'updated_at']
+
+    fieldsets = (
+        ('User Info', {
+            'fields': ('user',)
+        }),
+        ('Appearance', {
+            'fields': ('skin_type', 'hair_type', 'hair_length',
+                       'hair_color', 'face_image', 'face_analysis_data')
+        }),
+        ('Reservation Info', {
+            'fields': ('total_reservations', 'last_reservation_date', 'is_vip', 'notes')
+        }),
+        ('Notifications', {
+            'fields': ('wants_sms_notifications', 'wants_email_notifications')
+        }),
+        ('Address', {
+            'fields': ('address', 'city', 'state', 'postcode')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at')
+        }),
+    )
 
-    @admin.register(CustomerProfile)
-    class CustomerProfileAdmin(admin.ModelAdmin):
-        list_display = ['user','skin_type','hair_type','hair_length','hair_color',
-                        'total_reservations','last_reservation_date','created_at',]
-        list_filter = ['skin_type','hair_type','hair_length','hair_color','is_vip',]
-        search_fields = ['user__username','user__email','user__first_name','user__last_name',]
-        readonly_fields = ['total_reservations', 'last_reservation_date',
-                           'created_at', 'updated_at']
 
-        fieldsets = (
-            ('User Info', {
-                'fields': ('user',)
-            }),
-            ('Appearance', {
-                'fields': ('skin_type', 'hair_type', 'hair_length',
-                           'hair_color', 'face_image', 'face_analysis_data')
-            }),
-            ('Reservation Info', {
-                'fields': ('total_reservations', 'last_reservation_date', 'is_vip', 'notes')
-            }),
-            ('Notifications', {
-                'fields': ('wants_sms_notifications', 'wants_email_notifications')
-            }),
-            ('Address', {
-                'fields': ('address', 'city', 'state', 'postcode')
-            }),
-            ('Timestamps', {
-                'fields': ('created_at', 'updated_at')
-            }),
-        )
+class SpecialtyListFilter(admin.RelatedFieldListFilter):
+    # Service.__str__ includes the category name
+    def field_choices(self, field, request, model_admin):
+        services = field.related_model._default_manager.select_related('category')
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        if ordering:
+            services = services.order_by(*ordering)
+        return [(service.pk, str(service)) for service in services]
 
 
 @admin.register(StaffProfile)
@@ -62,12 +72,13 @@ class StaffProfileAdmin(admin.ModelAdmin):
     list_display = ['user','experience_years','rating','total_reviews',
                     'is_active','created_at' , 'updated_at']
 
-    list_filter = ['is_active','experience_years','specialties']
+    list_filter = ['is_active','experience_years',('specialties', SpecialtyListFilter)]
 
     search_fields = ['user__username','user__email','user__first_name',
                     'user__last_name','specialties__name']
 
 
+    list_select_related = ['user']
     list_editable = ['is_active']
 
     fieldsets = (
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+
+from appointment.models import Appointment
+from user.models import CustomerProfile
+
+
+class Command(BaseCommand):
+    help = 'Rebuild CustomerProfile.total_reservations and last_reservation_date from appointments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = {
+            row['customer_id']: (row['total'], row['latest'])
+            for row in (
+                Appointment.objects.exclude(status__in=Appointment.VOID_STATUSES)
+                .order_by().values('customer_id')
+                .annotate(total=Count('id'), latest=Max('starts_at'))
+            )
+        }
+
+        chunk_size = options['chunk_size']
+        profiles = CustomerProfile.objects.only('id', 'user_id', 'total_reservations', 'last_reservation_date')
+        batch, fixed = [], 0
+        for profile in profiles.order_by('id').iterator(chunk_size=chunk_size):
+            total, latest = stats.get(profile.user_id, (0, None))
+            if (profile.total_reservations, profile.last_reservation_date) == (total, latest):
+                continue
+            profile.total_reservations, profile.last_reservation_date = total, latest
+            batch.append(profile)
+            if len(batch) >= chunk_size:
+                CustomerProfile.objects.bulk_update(batch, ['total_reservations', 'last_reservation_date'])
+                fixed += len(batch)
+                batch = []
+        if batch:
+            CustomerProfile.objects.bulk_update(batch, ['total_reservations', 'last_reservation_date'])
+            fixed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {fixed} customer profiles'))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:42
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rating_sum(apps, schema_editor):
+    # seed the running sum from the stored average so existing ratings survive
+    StaffProfile = apps.get_model('user', 'StaffProfile')
+    rows = list(StaffProfile.objects.filter(total_reviews__gt=0).only('id', 'rating', 'total_reviews'))
+    for row in rows:
+        row.rating_sum = round((row.rating or 0) * row.total_reviews)
+    StaffProfile.objects.bulk_update(rows, ['rating_sum'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0014_recurringseries'),
+        ('user', '0007_alter_user_postcode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staffprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='rating_sum'),
+        ),
+        migrations.CreateModel(
+            name='StaffReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)], verbose_name='score')),
+                ('comment', models.TextField(blank=True, verbose_name='comment')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviews', to='appointment.appointment', verbose_name='appointment')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='staff_reviews', to=settings.AUTH_USER_MODEL, verbose_name='customer')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='user.staffprofile', verbose_name='staff')),
+            ],
+            options={
+                'verbose_name': 'staff review',
+                'verbose_name_plural': 'staff reviews',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(backfill_rating_sum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:28
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def seed_baseline(apps, schema_editor):
+    # whatever the running totals hold beyond the review rows predates them
+    StaffProfile = apps.get_model('user', 'StaffProfile')
+    StaffReview = apps.get_model('user', 'StaffReview')
+    reviews = {
+        row['staff_id']: (row['total'], row['reviews'])
+        for row in StaffReview.objects.values('staff_id').annotate(total=Sum('score'), reviews=Count('id')).order_by()
+    }
+    rows = list(StaffProfile.objects.filter(Q(rating_sum__gt=0) | Q(total_reviews__gt=0)).only('id', 'rating_sum', 'total_reviews'))
+    for row in rows:
+        total, count = reviews.get(row.pk, (0, 0))
+        row.baseline_rating_sum = max((row.rating_sum or 0) - total, 0)
+        row.baseline_rating_count = max((row.total_reviews or 0) - count, 0)
+    StaffProfile.objects.bulk_update(rows, ['baseline_rating_sum', 'baseline_rating_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0008_staffreview_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staffprofile',
+            name='baseline_rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='baseline rating count'),
+        ),
+        migrations.AddField(
+            model_name='staffprofile',
+            name='baseline_rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='baseline rating sum'),
+        ),
+        migrations.RunPython(seed_baseline, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from django.core.validators import RegexValidator
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
+
+from beauty_salon_project.ratings import apply_rating
 
 
 class User(AbstractUser):
@@ -192,6 +194,10 @@ class StaffProfile(models.Model):
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00, verbose_name='rating')
 
     total_reviews = models.PositiveIntegerField(default=0 , verbose_name='total_reviews')
+    rating_sum = models.PositiveIntegerField(default=0 , verbose_name='rating_sum')
+    # ratings without a StaffReview row; see beauty_salon_project.ratings
+    baseline_rating_sum = models.PositiveIntegerField(default=0 , editable=False , verbose_name='baseline rating sum')
+    baseline_rating_count = models.PositiveIntegerField(default=0 , editable=False , verbose_name='baseline rating count')
     certifications = models.JSONField(default=list,blank=True,verbose_name='certifications',)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -202,11 +208,35 @@ class StaffProfile(models.Model):
         verbose_name_plural = 'staff'
 
     def __str__(self):
-        return self.user
+        return str(self.user)
 
     def update_rating(self, new_rating):
+        # a rating with no StaffReview row, so it goes into the baseline
+        apply_rating(StaffProfile, self.pk, new_rating, count_field='total_reviews', baseline=True)
+        self.refresh_from_db(fields=['rating', 'rating_sum', 'total_reviews'])
+
+
+class StaffReview(models.Model):
+    staff = models.ForeignKey(StaffProfile, on_delete=models.CASCADE , related_name='reviews' , verbose_name='staff')
+    customer = models.ForeignKey(User, on_delete=models.CASCADE , related_name='staff_reviews' , verbose_name='customer')
+    appointment = models.ForeignKey('appointment.Appointment', on_delete=models.SET_NULL , blank=True , null=True , related_name='reviews' , verbose_name='appointment')
+    score = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)] , verbose_name='score')
+    comment = models.TextField(blank=True , verbose_name='comment')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
-        total_score = self.rating * self.total_reviews
-        self.total_reviews += 1
-        self.rating = (total_score + new_rating) / self.total_reviews
-        self.save()
\ No newline at end of file
+    class Meta:
+        verbose_name = 'staff review'
+        verbose_name_plural = 'staff reviews'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.staff_id} - {self.score}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_score = instance.__dict__.get('score')
+        instance._loaded_target = instance.__dict__.get('staff_id')
+        return instance
\ No newline at end of file
@@ -0,0 +1,64 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from appointment.models import Appointment
+from beauty_salon_project.ratings import apply_rating, move_rating
+
+from .models import StaffProfile, StaffReview
+from .stats import counts_as_reservation, reservation_added, reservation_removed
+
+
+@receiver(post_save, sender=StaffReview)
+def apply_staff_review(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        apply_rating(StaffProfile, instance.staff_id, instance.score, count_field='total_reviews')
+    else:
+        previous = getattr(instance, '_loaded_score', None)
+        if previous is not None:
+            previous_target = getattr(instance, '_loaded_target', None) or instance.staff_id
+            move_rating(StaffProfile, previous_target, instance.staff_id, previous, instance.score,
+                        count_field='total_reviews')
+    instance._loaded_score = instance.score
+    instance._loaded_target = instance.staff_id
+
+
+@receiver(post_delete, sender=StaffReview)
+def remove_staff_review(sender, instance, **kwargs):
+    score = getattr(instance, '_loaded_score', None) or instance.score
+    target = getattr(instance, '_loaded_target', None) or instance.staff_id
+    apply_rating(StaffProfile, target, -score, count=-1, count_field='total_reviews')
+
+
+@receiver(post_save, sender=Appointment)
+def update_customer_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    counted = counts_as_reservation(instance.status)
+    if created:
+        if counted:
+            reservation_added(instance.customer_id, instance.starts_at)
+        return
+
+    loaded = getattr(instance, '_loaded_values', None)
+    if not loaded or 'status' not in loaded or 'starts_at' not in loaded or 'customer_id' not in loaded:
+        return
+    was_counted = counts_as_reservation(loaded['status'])
+    moved = (loaded['customer_id'], loaded['starts_at']) != (instance.customer_id, instance.starts_at)
+    if was_counted and (not counted or moved):
+        reservation_removed(loaded['customer_id'], loaded['starts_at'])
+    if counted and (not was_counted or moved):
+        reservation_added(instance.customer_id, instance.starts_at)
+
+
+@receiver(post_delete, sender=Appointment)
+def remove_customer_reservation(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    # only fall back to attributes the load did not defer; the row is gone
+    status, customer_id, starts_at = (
+        loaded[field] if field in loaded else getattr(instance, field)
+        for field in ('status', 'customer_id', 'starts_at')
+    )
+    if counts_as_reservation(status):
+        reservation_removed(customer_id, starts_at)
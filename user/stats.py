@@ -0,0 +1,46 @@
+from django.db.models import F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from appointment.models import Appointment
+
+from .models import CustomerProfile
+
+# CustomerProfile.total_reservations / last_reservation_date are maintained
+# incrementally; the reconcile_customer_stats command rebuilds them.
+
+
+def counts_as_reservation(status):
+    return status not in Appointment.VOID_STATUSES
+
+
+def reservation_added(customer_id, starts_at, count=1):
+    CustomerProfile.objects.filter(user_id=customer_id).update(
+        total_reservations=F('total_reservations') + count,
+        last_reservation_date=Greatest(Coalesce(F('last_reservation_date'), Value(starts_at)), Value(starts_at)),
+    )
+
+
+def reservations_added(appointments):
+    # bulk_create skips post_save; one UPDATE per customer in the batch
+    per_customer = {}
+    for appointment in appointments:
+        if counts_as_reservation(appointment.status):
+            count, latest = per_customer.get(appointment.customer_id, (0, appointment.starts_at))
+            per_customer[appointment.customer_id] = (count + 1, max(latest, appointment.starts_at))
+    for customer_id, (count, latest) in per_customer.items():
+        reservation_added(customer_id, latest, count)
+
+
+def reservation_removed(customer_id, starts_at):
+    profiles = CustomerProfile.objects.filter(user_id=customer_id)
+    profiles.filter(total_reservations__gt=0).update(total_reservations=F('total_reservations') - 1)
+    if starts_at is not None:
+        profiles.filter(last_reservation_date=starts_at).update(last_reservation_date=latest_reservation())
+
+
+def latest_reservation():
+    return Subquery(
+        Appointment.objects.filter(customer_id=OuterRef('user_id'))
+        .exclude(status__in=Appointment.VOID_STATUSES)
+        .order_by().values('customer_id').annotate(latest=Max('starts_at')).values('latest')
+    )
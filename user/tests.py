@@ -1,3 +1,142 @@
+from datetime import time, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from appointment.booking import bulk_book
+from appointment.models import Appointment, Service, ServiceCategory
+from appointment.tests import SalonFixture, at
+from beauty_salon_project.testing import ChangelistQueryBudgetMixin, bulk_users
+from .models import CustomerProfile, StaffProfile, StaffReview, User
+
+
+class AdminQueryBudgetTests(ChangelistQueryBudgetMixin, TestCase):
+    ROWS = 1200
+
+    @classmethod
+    def setUpTestData(cls):
+        customers = bulk_users('customer', cls.ROWS)
+        staff = bulk_users('staff', cls.ROWS, role='staff')
+        CustomerProfile.objects.bulk_create([CustomerProfile(user=user) for user in customers])
+        profiles = StaffProfile.objects.bulk_create([StaffProfile(user=user) for user in staff])
+        categories = ServiceCategory.objects.bulk_create([
+            ServiceCategory(name=f'category{i}', slug=f'category{i}') for i in range(10)
+        ])
+        services = Service.objects.bulk_create([
+            Service(category=categories[i % 10], name=f'service{i}', slug=f'service{i}', price=100, duration=30)
+            for i in range(200)
+        ])
+        StaffProfile.specialties.through.objects.bulk_create([
+            StaffProfile.specialties.through(staffprofile=profile, service=services[i % 200])
+            for i, profile in enumerate(profiles)
+        ])
+
+    def test_user_changelist(self):
+        self.assertChangelistQueries(User, 5)
+
+    def test_customer_profile_changelist(self):
+        self.assertChangelistQueries(CustomerProfile, 5)
+
+    def test_staff_profile_changelist(self):
+        self.assertChangelistQueries(StaffProfile, 7)
+
+
+class StaffRatingTests(TestCase):
+
+    def setUp(self):
+        users = bulk_users('stylist', 2, role='staff')
+        self.customer = bulk_users('reviewer', 1)[0]
+        self.first, self.second = [StaffProfile.objects.create(user=user) for user in users]
+
+    def review(self, staff, score):
+        return StaffReview.objects.create(staff=staff, customer=self.customer, score=score)
+
+    def totals(self, staff):
+        staff.refresh_from_db()
+        return staff.rating_sum, staff.total_reviews, staff.rating
+
+    def test_reviews_update_the_running_totals(self):
+        review = self.review(self.first, 5)
+        self.review(self.first, 2)
+        self.assertEqual(self.totals(self.first), (7, 2, Decimal('3.50')))
+
+        review = StaffReview.objects.get(pk=review.pk)
+        review.score = 4
+        review.save()
+        self.assertEqual(self.totals(self.first), (6, 2, Decimal('3.00')))
+        review.delete()
+        self.assertEqual(self.totals(self.first), (2, 1, Decimal('2.00')))
+
+    def test_moving_a_review_moves_its_score(self):
+        review = StaffReview.objects.get(pk=self.review(self.first, 4).pk)
+        review.staff, review.score = self.second, 3
+        review.save()
+
+        self.assertEqual(self.totals(self.first), (0, 0, Decimal('0.00')))
+        self.assertEqual(self.totals(self.second), (3, 1, Decimal('3.00')))
+
+    def test_recompute_keeps_the_baseline_and_fixes_drift(self):
+        self.first.update_rating(5)
+        self.review(self.first, 3)
+        StaffProfile.objects.update(rating_sum=40, total_reviews=9, rating=1)
+        call_command('recompute_staff_ratings', stdout=StringIO())
+
+        self.assertEqual(self.totals(self.first), (8, 2, Decimal('4.00')))
+        # no reviews at all: reset to its (empty) baseline
+        self.assertEqual(self.totals(self.second), (0, 0, Decimal('0.00')))
+
+
+class CustomerStatsTests(SalonFixture, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.profile = CustomerProfile.objects.create(user=self.customer)
+
+    def stats(self):
+        self.profile.refresh_from_db()
+        return self.profile.total_reservations, self.profile.last_reservation_date
+
+    def test_booking_and_cancelling(self):
+        self.book(9)
+        later = self.book(11)
+        self.assertEqual(self.stats(), (2, at(self.day, 11)))
+
+        later = Appointment.objects.get(pk=later.pk)
+        later.status = 'cancelled'
+        later.save()
+        self.assertEqual(self.stats(), (1, at(self.day, 9)))
+        # cancelled appointments are not counted when created either
+        self.book(10, status='rejected')
+        self.assertEqual(self.stats(), (1, at(self.day, 9)))
+
+    def test_moving_and_deleting(self):
+        appointment = Appointment.objects.get(pk=self.book(9).pk)
+        next_week = self.day + timedelta(days=7)
+        appointment.appointment_date, appointment.appointment_time = at(next_week, 10), time(10)
+        appointment.save()
+        self.assertEqual(self.stats(), (1, at(next_week, 10)))
+
+        Appointment.objects.get(pk=appointment.pk).delete()
+        self.assertEqual(self.stats(), (0, None))
+
+    def test_bulk_book_counts_the_batch(self):
+        rows = [
+            {'customer_id': self.customer.pk, 'staff_id': self.staff.pk, 'service_id': self.service.pk,
+             'appointment_date': at(self.day, hour), 'appointment_time': time(hour), 'payment_method': 'cash',
+             'status': status}
+            for hour, status in ((9, 'pending'), (10, 'confirmed'), (11, 'cancelled'))
+        ]
+        self.assertEqual(bulk_book(rows), (3, []))
+        self.assertEqual(self.stats(), (2, at(self.day, 10)))
+
+    def test_reconcile_fixes_drift(self):
+        self.book(9)
+        self.book(10)
+        CustomerProfile.objects.update(total_reservations=7, last_reservation_date=None)
+        out = StringIO()
+        call_command('reconcile_customer_stats', stdout=out)
+
+        self.assertEqual(self.stats(), (2, at(self.day, 10)))
+        self.assertIn('Reconciled 1 customer profiles', out.getvalue())